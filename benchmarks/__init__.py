@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                model_data_handler                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
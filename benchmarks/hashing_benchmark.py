@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                model_data_handler                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+from typing import List
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from utility.bronze import hashing_utility, json_utility
+
+
+def generate_test_file(file_path: str, size: int, block_size: int = 64*1024*1024) -> None:
+    """
+    Function for generating a test file with random content.
+    :param file_path: File path.
+    :param size: File size in bytes.
+    :param block_size: Size of blocks to write in bytes. Defaults to 64 MiB.
+    """
+    with open(file_path, "wb") as file:
+        written = 0
+        while written < size:
+            written += file.write(os.urandom(min(block_size, size - written)))
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def drop_file_from_page_cache(file_path: str) -> None:
+    """
+    Function for dropping a file from the page cache, so that every run starts with a cold cache.
+    :param file_path: File path.
+    """
+    if hasattr(os, "posix_fadvise"):
+        with open(file_path, "rb") as file:
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def run_benchmark(file_path: str, io_modes: List[str], buffer_sizes: List[int], repetitions: int, cold: bool) -> List[dict]:
+    """
+    Function for measuring SHA256 hashing throughput for I/O modes and buffer sizes.
+    :param file_path: Path of the file to hash.
+    :param io_modes: I/O modes to benchmark.
+    :param buffer_sizes: Buffer sizes in bytes to benchmark.
+    :param repetitions: Number of repetitions per combination.
+    :param cold: Flag for dropping the file from the page cache before each run.
+    :return: Results as list of dictionaries.
+    """
+    size = os.path.getsize(file_path)
+    results = []
+    for io_mode in io_modes:
+        for buffer_size in buffer_sizes:
+            durations = []
+            for _ in range(repetitions):
+                if cold:
+                    drop_file_from_page_cache(file_path)
+                start = perf_counter()
+                hashing_utility.hash_with_sha256(file_path, buffer_size, io_mode)
+                durations.append(perf_counter() - start)
+            best = min(durations)
+            results.append({
+                "io_mode": io_mode,
+                "buffer_size": buffer_size,
+                "best_seconds": best,
+                "best_gb_per_second": size / best / 1e9,
+                "mean_gb_per_second": size / (sum(durations) / len(durations)) / 1e9
+            })
+            print(f"{io_mode:>10} {buffer_size // 1024:>8} KiB {results[-1]['best_gb_per_second']:>8.3f} GB/s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hashing throughput for I/O modes and buffer sizes.")
+    parser.add_argument("--file", type=str, default=None, help="File to hash. Defaults to a generated test file.")
+    parser.add_argument("--size", type=float, default=2.0, help="Size of the generated test file in GB.")
+    parser.add_argument("--io-modes", type=str, nargs="+", default=hashing_utility.IO_MODES, choices=hashing_utility.IO_MODES)
+    parser.add_argument("--buffer-sizes", type=int, nargs="+", default=[64, 128, 1024, 4096, 16384], help="Buffer sizes in KiB.")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--warm", action="store_true", help="Keep the file in the page cache between runs.")
+    parser.add_argument("--output", type=str, default=None, help="Path for saving results as JSON.")
+    args = parser.parse_args()
+
+    test_file = args.file
+    if test_file is None:
+        test_file = os.path.join(tempfile.mkdtemp(), "hashing_benchmark.bin")
+        print(f"Generating {args.size} GB test file under '{test_file}'...")
+        generate_test_file(test_file, int(args.size * 1e9))
+    try:
+        results = run_benchmark(test_file, args.io_modes, [size * 1024 for size in args.buffer_sizes], 
+                                args.repetitions, not args.warm)
+        if args.output:
+            json_utility.save(results, args.output)
+    finally:
+        if args.file is None:
+            os.remove(test_file)
+            os.rmdir(os.path.dirname(test_file))
@@ -5,7 +5,8 @@
 *            (c) 2023 Alexander Hering             *
 ****************************************************
 """
-from typing import Any, Optional, List
+from time import perf_counter
+from typing import Any, Optional, List, Iterator, Tuple, Callable
 import abc
 
 
@@ -45,4 +46,39 @@ class AbstractAPIWrapper(abc.ABC):
         :param kwargs: Arbitrary keyword arguments.
         :return: Metadata for given model ID.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def collect_metadata_many(self, identifier: str, model_ids: List[Any], *args: Optional[List], **kwargs: Optional[dict]) -> Iterator[Tuple[Any, dict]]:
+        """
+        Method for acquring model data for multiple models by identifier.
+        Defaults to sequential calls of collect_metadata, implementations may resolve IDs concurrently
+        and yield results in order of completion.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type.
+        :param args: Arbitrary arguments.
+        :param kwargs: Arbitrary keyword arguments.
+        :return: Iterator, yielding tuples of identification and metadata.
+        """
+        for model_id in model_ids:
+            yield model_id, self.collect_metadata(identifier, model_id, *args, **kwargs)
+
+    def request_metadata_many(self, identifier: str, model_ids: List[Any], conditional: bool = False,
+                              latency_callback: Optional[Callable[[Any, float], None]] = None) -> Iterator[Tuple[Any, str, dict]]:
+        """
+        Method for requesting model data for multiple models by identifier with response status.
+        Defaults to sequential calls of collect_metadata without conditional requests, reporting status 'ok' 
+        for non-empty metadata and 'error' otherwise. Implementations may report further statuses, 
+        like 'unchanged' or 'not_found'.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type.
+        :param conditional: Flag for sending conditional requests. Defaults to False.
+        :param latency_callback: Callback, taking the identification and the request duration in seconds.
+            Defaults to None.
+        :return: Iterator, yielding tuples of identification, status and metadata.
+        """
+        for model_id in model_ids:
+            start = perf_counter()
+            metadata = self.collect_metadata(identifier, model_id)
+            if latency_callback is not None:
+                latency_callback(model_id, perf_counter() - start)
+            yield model_id, "ok" if metadata else "error", metadata
@@ -5,10 +5,11 @@
 *            (c) 2023 Alexander Hering             *
 ****************************************************
 """
-from typing import Any, Optional, List
+import os
+from typing import Any, Optional, List, Iterator, Tuple
 import abc
 from model.abstract_api_wrapper import AbstractAPIWrapper
-from utility.bronze import json_utility
+from utility.bronze import json_utility, hashing_utility, metrics_utility, time_utility
 
 class AbstractHandler(abc.ABC):
     """
@@ -20,6 +21,8 @@ class AbstractHandler(abc.ABC):
         """
         self.cache = {}
         self.api = api_wrapper
+        self.metrics = metrics_utility.MetricsCollector()
+        self.metrics_folder = None
 
     def collect_metadata(self, identifier: str, model_id: Any, *args: Optional[List], **kwargs: Optional[dict]) -> dict:
         """
@@ -30,7 +33,22 @@ class AbstractHandler(abc.ABC):
         :param kwargs: Arbitrary keyword arguments.
         :return: Metadata for given model ID.
         """
-        return self.api.collect_metadata(identifier, model_id, *args, **kwargs)
+        with self.metrics.measure("api_latency"):
+            return self.api.collect_metadata(identifier, model_id, *args, **kwargs)
+
+    def collect_metadata_many(self, identifier: str, model_ids: List[Any], *args: Optional[List], **kwargs: Optional[dict]) -> Iterator[Tuple[Any, dict]]:
+        """
+        Method for acquring model data for multiple models by identifier.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type.
+        :param args: Arbitrary arguments.
+        :param kwargs: Arbitrary keyword arguments.
+        :return: Iterator, yielding tuples of identification and metadata, potentially in order of completion.
+        """
+        with self.metrics.measure("api_batch_duration"):
+            for model_id, metadata in self.api.collect_metadata_many(identifier, model_ids, *args, **kwargs):
+                self.metrics.increment("api_batch_requests")
+                yield model_id, metadata
 
     def import_data(self, import_path: str) -> None:
         """
@@ -46,6 +64,108 @@ class AbstractHandler(abc.ABC):
         """
         json_utility.save(self.cache, export_path)
 
+    def get_indexed_hash(self, file_path: str) -> Optional[dict]:
+        """
+        Method for looking up the hashes of a file in the persistent hash index.
+        Entries are keyed by file identity (device, inode, size and modification time), 
+        so a changed file does not match its old entry anymore.
+        :param file_path: File path.
+        :return: Indexed hashes, if file is unchanged since indexing, else None.
+        """
+        entry = self.cache.get("hash_index", {}).get(hashing_utility.get_file_identity(file_path))
+        if entry is not None and "hashes" in entry:
+            self.metrics.increment("hash_index_hits")
+            entry["path"] = file_path
+            return entry["hashes"]
+        self.metrics.increment("hash_index_misses")
+
+    def index_hash(self, file_path: str, file_hashes: dict) -> None:
+        """
+        Method for adding the hashes of a file to the persistent hash index.
+        :param file_path: File path.
+        :param file_hashes: File hashes.
+        """
+        self.cache.setdefault("hash_index", {})[hashing_utility.get_file_identity(file_path)] = {
+            "path": file_path,
+            "hashes": file_hashes
+        }
+
+    def relocate_indexed_hash(self, identity: str, file_path: str) -> None:
+        """
+        Method for pointing the hash index entry of a moved file to its new path.
+        The entry is re-keyed, if the move changed the file identity, e.g. when moving across devices.
+        :param identity: File identity before the move.
+        :param file_path: New file path.
+        """
+        entry = self.cache.get("hash_index", {}).pop(identity, None)
+        if entry is not None and "hashes" in entry:
+            self.index_hash(file_path, entry["hashes"])
+
+    def prune_hash_index(self, folder: str, file_paths: Optional[List[str]] = None) -> None:
+        """
+        Method for removing outdated hash index entries of files under a given folder.
+        :param folder: Folder to prune entries for.
+        :param file_paths: File paths to restrict pruning to. Defaults to None in which case all entries under the folder are checked.
+        """
+        hash_index = self.cache.get("hash_index", {})
+        file_paths = None if file_paths is None else set(file_paths)
+        folder = os.path.join(folder, "")
+        for identity in [identity for identity in hash_index if hash_index[identity]["path"].startswith(folder) 
+                         and (file_paths is None or hash_index[identity]["path"] in file_paths)]:
+            file_path = hash_index[identity]["path"]
+            if not os.path.exists(file_path) or hashing_utility.get_file_identity(file_path) != identity:
+                hash_index.pop(identity)
+
+    def record_hashing_statistics(self, file_path: str, statistics: dict) -> None:
+        """
+        Method for recording the statistics of a hashing process.
+        :param file_path: Hashed file path.
+        :param statistics: Hashing statistics with hashed 'bytes', 'seconds' and 'worker' process ID.
+        """
+        self.metrics.increment("hashed_files")
+        self.metrics.increment("hashed_bytes", statistics["bytes"])
+        self.metrics.record_throughput("hashing", statistics["bytes"], statistics["seconds"])
+        self.metrics.record_throughput(f"hashing_worker_{statistics['worker']}", statistics["bytes"], statistics["seconds"])
+
+    def record_hashing_error(self, file_path: str, ex: Exception) -> None:
+        """
+        Method for recording a failed hashing process.
+        :param file_path: File path, which could not be hashed.
+        :param ex: Raised exception.
+        """
+        self._logger.warn(f"Could not hash '{file_path}': '{ex}'.")
+        self.metrics.increment("hashing_errors")
+
+    def get_metrics(self) -> dict:
+        """
+        Method for getting a summary of the collected metrics.
+        Throughputs are reported in bytes per second, hashing throughputs additionally in GB/s.
+        :return: Metrics summary.
+        """
+        summary = self.metrics.summary()
+        for name in [name for name in summary["throughputs"] if name.startswith("hashing")]:
+            summary["throughputs"][name]["gb_per_second"] = summary["throughputs"][name]["per_second"] / 1e9
+        return summary
+
+    def reset_metrics(self) -> None:
+        """
+        Method for resetting the collected metrics.
+        """
+        self.metrics.reset()
+
+    def dump_metrics(self, run_name: str) -> dict:
+        """
+        Method for dumping the metrics summary of a run as JSON file into the metrics folder, if one is set.
+        :param run_name: Run name, used as file name prefix.
+        :return: Metrics summary.
+        """
+        summary = self.get_metrics()
+        if self.metrics_folder is not None:
+            if not os.path.exists(self.metrics_folder):
+                os.makedirs(self.metrics_folder)
+            json_utility.save(summary, os.path.join(self.metrics_folder, f"{run_name}_{time_utility.get_timestamp()}.json"))
+        return summary
+
     @abc.abstractmethod
     def load_model_folder(self, *args: Optional[List], **kwargs: Optional[dict]) -> None:
         """
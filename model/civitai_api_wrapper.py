@@ -5,29 +5,91 @@
 *            (c) 2023 Alexander Hering             *
 ****************************************************
 """
+import os
 import requests
 import json
-from time import sleep
-import shutil
+import tempfile
+import threading
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
 from logging import Logger
-from typing import Any, Optional, List
+from typing import Any, Optional, List, Iterator, Tuple, Callable
+from ..utility.bronze import requests_utility, rate_limiting_utility, response_cache_utility, single_flight_utility, range_download_utility
 from ..utility.silver import image_utility, internet_utility
 from ..configuration import configuration as cfg
 from abstract_api_wrapper import AbstractAPIWrapper
 
+
+"""
+Rate limiter, shared by all wrapper instances and threads. Requests to the API and to content delivery hosts use
+separate token buckets.
+"""
+RATE_LIMITER = rate_limiting_utility.RateLimiter(
+    buckets={
+        "api": rate_limiting_utility.TokenBucket(rate=5.0, capacity=10.0),
+        "cdn": rate_limiting_utility.TokenBucket(rate=10.0, capacity=20.0)
+    },
+    category_hosts={"api": ["civitai.com"]},
+    default_category="cdn"
+)
+
 class CivitaiAbstractAPIWrapper(AbstractAPIWrapper):
     """
     Class, representing civitai API wrapper.
     """
-    def __init__(self) -> None:
+    def __init__(self, pool_size: int = 10, retries: int = 3, 
+                 rate_limiter: Optional[rate_limiting_utility.RateLimiter] = None,
+                 response_cache_folder: Optional[str] = os.path.join(cfg.PATHS.DATA_PATH, "response_cache")) -> None:
         """
         Initiation method.
+        :param pool_size: Size of the keep-alive connection pool, shared by all requests. Defaults to 10.
+        :param retries: Number of transport-level retries for idempotent requests. Defaults to 3.
+        :param rate_limiter: Rate limiter. Defaults to None in which case the module level rate limiter is shared.
+        :param response_cache_folder: Folder for caching metadata responses for conditional requests. 
+            Defaults to 'data/response_cache'. None disables the response cache.
         """
         self._logger = Logger("[CivitaiAbstractAPIWrapper]")
+        self.pool_size = pool_size
+        self.retries = retries
+        self.throttling_retries = 5
+        self.request_timeout = (10.0, 60.0)
+        self.rate_limiter = rate_limiter or RATE_LIMITER
+        self.session = requests_utility.get_pooled_session(pool_size, retries, respect_retry_after=False)
+        self.response_cache = response_cache_utility.ResponseCache(response_cache_folder) if response_cache_folder else None
+        self.single_flight = single_flight_utility.SingleFlight()
         self.base_url = "https://civitai.com/"
         self.api_base_url = "https://civitai.com/api/v1/"
         self.model_by_versionhash_url = "https://civitai.com/api/v1/model-versions/by-hash/"
         self.model_by_id_url = "https://civitai.com/api/v1/models/"
+        self.model_version_by_id_url = "https://civitai.com/api/v1/model-versions/"
+
+    def set_pool_size(self, pool_size: int) -> None:
+        """
+        Method for resizing the connection pool.
+        :param pool_size: Size of the keep-alive connection pool.
+        """
+        if pool_size != self.pool_size:
+            self.pool_size = pool_size
+            old_session = self.session
+            self.session = requests_utility.get_pooled_session(pool_size, self.retries, respect_retry_after=False)
+            old_session.close()
+
+    def _get(self, url: str, **kwargs: Optional[dict]) -> requests.Response:
+        """
+        Internal method for issuing a rate limited GET request.
+        Throttled requests (429, 503) slow down the shared rate limiter and are retried after the requested delay.
+        :param url: URL.
+        :param kwargs: Keyword arguments for the request. The 'timeout' defaults to the wrapper's connect and read timeouts.
+        :return: Response.
+        """
+        kwargs.setdefault("timeout", self.request_timeout)
+        for attempt in range(self.throttling_retries + 1):
+            self.rate_limiter.acquire(url)
+            response = self.session.get(url, **kwargs)
+            if not self.rate_limiter.report(url, response.status_code, response.headers.get("Retry-After")) or attempt == self.throttling_retries:
+                return response
+            self._logger.warn(f"Request to '{url}' was throttled with status {response.status_code}, retrying...")
+            response.close()
 
     def check_connection(self, *args: Optional[List], **kwargs: Optional[dict]) -> bool:
         """
@@ -36,28 +98,197 @@ class CivitaiAbstractAPIWrapper(AbstractAPIWrapper):
         :param kwargs: Arbitrary keyword arguments.
         :return: True if connection was established successfuly else False.
         """
-        result = requests.get(self.base_url).status_code == 200
+        result = self._get(self.base_url).status_code == 200
         self._logger.info("Connection was successfuly established.") if result else self._logger.warn("Connection could not be established.") 
         return result
     
     @internet_utility.timeout(360.0)
-    def download_image(url: str, output_path: str) -> bool:
+    def download_image(self, url: str, output_path: str) -> bool:
         """
         Method for downloading image to disk.
+        The image is validated while it streams in and written to a temporary file, which only replaces the
+        output file, if the image is valid. Invalid images are aborted with the first corrupt chunk.
+        Raises an internet_utility.TimeoutException, if the download times out.
         :param url: Image URL.
         :param output_path: Output path.
         :return: True, if process was successful, else False.
         """
-        sleep(2)
-        download = requests.get(url, stream=True, headers={"Authorization": cfg.CIVITAI_API_KEY})
-        with open(output_path, 'wb') as file:
-            shutil.copyfileobj(download.raw, file)
-        del download
-        if image_utility.check_image_health(output_path):
-            return True
-        else:
-            return False
+        with self._get(url, stream=True, headers={"Authorization": cfg.CIVITAI_API_KEY}) as download:
+            download.raise_for_status()
+            content_length = download.headers.get("Content-Length")
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), suffix=".part")
+            try:
+                with os.fdopen(file_descriptor, "wb") as file:
+                    validator = image_utility.StreamingImageValidator(
+                        download.headers.get("Content-Type"),
+                        int(content_length) if content_length and "Content-Encoding" not in download.headers else None)
+                    for chunk in download.iter_content(chunk_size=64*1024):
+                        internet_utility.check_cancelled()
+                        validator.feed(chunk)
+                        file.write(chunk)
+                    validator.close()
+                os.replace(temporary_path, output_path)
+                return True
+            except image_utility.ImageValidationException as ex:
+                self._logger.warn(f"Image from '{url}' is invalid: '{ex}'.")
+                return False
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
     
+    def probe_url(self, url: str, content_type_prefix: str = "image/") -> bool:
+        """
+        Method for cheaply checking, whether an URL serves content, by requesting only its first byte.
+        :param url: URL.
+        :param content_type_prefix: Expected content type prefix. Defaults to 'image/'.
+        :return: True, if URL serves content of the expected type, else False.
+        """
+        try:
+            with self._get(url, stream=True, headers={"Authorization": cfg.CIVITAI_API_KEY, "Range": "bytes=0-0"}) as resp:
+                return resp.status_code in [200, 206] and resp.headers.get("Content-Type", "").lower().startswith(content_type_prefix)
+        except requests.RequestException as ex:
+            self._logger.warn(f"'{ex}' occured while probing '{url}'.")
+            return False
+
+    def download_file(self, url: str, output_path: str, workers: int = 8, 
+                      chunk_size: int = range_download_utility.DEFAULT_CHUNK_SIZE, chunk_retries: int = 3,
+                      progress_callback: Optional[Callable[[int, int], None]] = None, hasher: Optional[Any] = None) -> bool:
+        """
+        Method for downloading a file with parallel range requests.
+        The file is split into chunks, which are fetched concurrently and written into the preallocated output file
+        at their offsets. Finished chunks are persisted in a chunk map next to the output file, so that interrupted 
+        downloads resume with the missing chunks. Servers without range support are downloaded in a single stream.
+        Chunks are requested from the URL, the download was redirected to. Redirect targets, like presigned storage URLs,
+        only receive the range header, the API key is not sent along.
+        :param url: File URL.
+        :param output_path: Output path.
+        :param workers: Number of concurrent range requests. Defaults to 8.
+        :param chunk_size: Chunk size in bytes. Defaults to 16 MiB.
+        :param chunk_retries: Number of tries per chunk. Defaults to 3.
+        :param progress_callback: Callback, taking the downloaded and the total number of bytes. Defaults to None.
+        :param hasher: Hasher with an 'update' method, which is fed with the file content during the download,
+            e.g. a hashing_utility.MultiHasher. Since chunks finish out of order, a dedicated hashing thread waits for
+            the next chunk in file order and reads it back while it is still in the page cache, so that the download 
+            workers are not held up by hashing. Defaults to None.
+            The hasher only covers the full file, if the download was successful.
+        :return: True, if process was successful, else False.
+        """
+        headers = {"Authorization": cfg.CIVITAI_API_KEY}
+        with self._get(url, stream=True, headers=dict(headers, Range="bytes=0-0")) as probe:
+            content_range = range_download_utility.parse_content_range(probe.headers.get("Content-Range"))
+            if probe.status_code == 200 or (probe.status_code == 206 and (content_range is None or content_range[2] is None)):
+                self._logger.info(f"'{url}' does not support range requests, downloading in a single stream...")
+                return self._download_stream(url, output_path, progress_callback, hasher)
+            elif probe.status_code != 206:
+                self._logger.warn(f"Could not download '{url}', status {probe.status_code}.")
+                return False
+            resolved_url = probe.url
+        chunk_headers = headers if resolved_url == url else {}
+        size = content_range[2]
+
+        ranges = range_download_utility.get_ranges(size, chunk_size)
+        chunk_map = range_download_utility.load_chunk_map(output_path, size, chunk_size, url)
+        completed = set(chunk_map["completed"])
+        if completed:
+            self._logger.info(f"Resuming download of '{url}' with {len(completed)} of {len(ranges)} chunks finished...")
+        range_download_utility.preallocate_file(output_path, size, keep_content=bool(completed))
+        self.set_pool_size(max(self.pool_size, workers))
+        lock = threading.Condition()
+        progress = [sum(ranges[index][1] - ranges[index][0] + 1 for index in completed)]
+        fetching_finished = threading.Event()
+        hashing_errors = []
+
+        def hash_chunks() -> None:
+            """Feed finished chunks into the hasher in file order."""
+            try:
+                for index, (start, end) in enumerate(ranges):
+                    with lock:
+                        lock.wait_for(lambda: index in completed or fetching_finished.is_set())
+                        if index not in completed:
+                            return
+                    for offset in range(start, end + 1, 1024*1024):
+                        hasher.update(writer.read(offset, min(1024*1024, end + 1 - offset)))
+            except OSError as ex:
+                hashing_errors.append(ex)
+
+        def fetch(index: int) -> bool:
+            """Fetch and write a single chunk."""
+            start, end = ranges[index]
+            for attempt in range(1, chunk_retries + 1):
+                try:
+                    with self._get(resolved_url, stream=True, headers=dict(chunk_headers, Range=f"bytes={start}-{end}")) as resp:
+                        received = range_download_utility.parse_content_range(resp.headers.get("Content-Range"))
+                        if resp.status_code != 206 or received is None or received[:2] != (start, end):
+                            raise IOError(f"Unexpected response with status {resp.status_code} for bytes {start}-{end}.")
+                        offset = start
+                        for chunk in resp.iter_content(chunk_size=1024*1024):
+                            writer.write(offset, chunk)
+                            offset += len(chunk)
+                        if offset != end + 1:
+                            raise IOError(f"Received {offset - start} of {end - start + 1} bytes for bytes {start}-{end}.")
+                    with lock:
+                        completed.add(index)
+                        chunk_map["completed"] = sorted(completed)
+                        range_download_utility.save_chunk_map(output_path, chunk_map)
+                        progress[0] += end - start + 1
+                        if progress_callback is not None:
+                            progress_callback(progress[0], size)
+                        lock.notify_all()
+                    return True
+                except (requests.RequestException, IOError) as ex:
+                    self._logger.warn(f"'{ex}' occured while downloading chunk {index} of '{url}' ({attempt} tries).")
+            return False
+
+        with range_download_utility.PositionalWriter(output_path) as writer:
+            hashing_thread = threading.Thread(target=hash_chunks, daemon=True)
+            if hasher is not None:
+                hashing_thread.start()
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(fetch, [index for index in range(len(ranges)) if index not in completed]))
+            finally:
+                with lock:
+                    fetching_finished.set()
+                    lock.notify_all()
+                if hasher is not None:
+                    hashing_thread.join()
+        if hashing_errors:
+            self._logger.warn(f"'{hashing_errors[0]}' occured while hashing '{output_path}'.")
+            return False
+        if all(results):
+            range_download_utility.remove_chunk_map(output_path)
+            return True
+        self._logger.warn(f"Download of '{url}' is incomplete, {len(ranges) - len(completed)} chunks are missing.")
+        return False
+
+    def _download_stream(self, url: str, output_path: str, progress_callback: Optional[Callable[[int, int], None]] = None,
+                         hasher: Optional[Any] = None) -> bool:
+        """
+        Internal method for downloading a file in a single stream.
+        :param url: File URL.
+        :param output_path: Output path.
+        :param progress_callback: Callback, taking the downloaded and the total number of bytes (0, if unknown). 
+            Defaults to None.
+        :param hasher: Hasher with an 'update' method, which is fed with the file content. Defaults to None.
+        :return: True, if process was successful, else False.
+        """
+        with self._get(url, stream=True, headers={"Authorization": cfg.CIVITAI_API_KEY}) as download:
+            if download.status_code != 200:
+                self._logger.warn(f"Could not download '{url}', status {download.status_code}.")
+                return False
+            size = int(download.headers.get("Content-Length", 0))
+            downloaded = 0
+            with open(output_path, "wb") as file:
+                for chunk in download.iter_content(chunk_size=1024*1024):
+                    file.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    downloaded += len(chunk)
+                    if progress_callback is not None:
+                        progress_callback(downloaded, size)
+        range_download_utility.remove_chunk_map(output_path)
+        return not size or downloaded == size
+
     def get_api_url(self, identifier: str, model_id: Any, *args: Optional[List], **kwargs: Optional[dict]) -> str:
         """
         Abstract method for acquring API URL for model.
@@ -67,7 +298,7 @@ class CivitaiAbstractAPIWrapper(AbstractAPIWrapper):
         :param kwargs: Arbitrary keyword arguments.
         :return: API URL for given model ID.
         """
-        return {"hash": self.model_by_versionhash_url, "id": self.model_by_id_url}[identifier] + str(model_id)
+        return {"hash": self.model_by_versionhash_url, "id": self.model_by_id_url, "version": self.model_version_by_id_url}[identifier] + str(model_id)
 
     def collect_metadata(self, identifier: str, model_id: Any, *args: Optional[List], **kwargs: Optional[dict]) -> dict:
         """
@@ -78,10 +309,96 @@ class CivitaiAbstractAPIWrapper(AbstractAPIWrapper):
         :param kwargs: Arbitrary keyword arguments.
         :return: Metadata for given model ID.
         """
+        return self.request_metadata(identifier, model_id)[1]
+
+    def request_metadata(self, identifier: str, model_id: Any, conditional: bool = False) -> Tuple[str, dict]:
+        """
+        Method for requesting model data by identifier with response status.
+        :param identifier: Type of identification.
+        :model_id: Identification of specified type.
+        :param conditional: Flag for sending a conditional request, based on the cached response validators.
+            Defaults to False.
+        :return: Tuple of status and metadata. Status can be
+            'ok': Metadata was fetched.
+            'unchanged': Metadata did not change since it was cached, the cached metadata is returned.
+            'not_found': Model is unknown.
+            'error': Request failed.
+            Concurrent requests for the same model are coalesced into a single request.
+        """
+        return self.single_flight.do((identifier, str(model_id), conditional), 
+                                     lambda: self._request_metadata(identifier, model_id, conditional))
+
+    def _request_metadata(self, identifier: str, model_id: Any, conditional: bool = False) -> Tuple[str, dict]:
+        """
+        Internal method for requesting model data by identifier with response status.
+        :param identifier: Type of identification.
+        :model_id: Identification of specified type.
+        :param conditional: Flag for sending a conditional request. Defaults to False.
+        :return: Tuple of status and metadata, see request_metadata.
+        """
         self._logger.info(f"Fetching metadata for model with '{model_id}' as '{identifier}'...")
-        resp = requests.get(self.get_api_url(identifier, model_id), headers={"Authorization": cfg.CIVITAI_API_KEY})
+        url = self.get_api_url(identifier, model_id)
+        headers = {"Authorization": cfg.CIVITAI_API_KEY}
+        if conditional and self.response_cache is not None:
+            headers.update(self.response_cache.get_conditional_headers(url))
+        try:
+            resp = self._get(url, headers=headers)
+        except requests.RequestException as ex:
+            self._logger.warn(f"Request to '{url}' failed: '{ex}'.")
+            return "error", {}
+        return self._handle_metadata_response(url, resp.status_code, resp.headers, resp.content)
+
+    def request_metadata_many(self, identifier: str, model_ids: List[Any], conditional: bool = False,
+                              latency_callback: Optional[Callable[[Any, float], None]] = None) -> Iterator[Tuple[Any, str, dict]]:
+        """
+        Method for requesting model data for multiple models by identifier with response status.
+        Model IDs are consumed lazily, so that they can be produced while earlier requests are handled.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type.
+        :param conditional: Flag for sending conditional requests. Defaults to False.
+        :param latency_callback: Callback, taking the identification and the request duration in seconds.
+            Defaults to None.
+        :return: Iterator, yielding tuples of identification, status and metadata.
+        """
+        for model_id in model_ids:
+            start = perf_counter()
+            status, metadata = self.request_metadata(identifier, model_id, conditional)
+            if latency_callback is not None:
+                latency_callback(model_id, perf_counter() - start)
+            yield model_id, status, metadata
+
+    def _handle_metadata_response(self, url: str, status_code: int, headers: Any, content: bytes) -> Tuple[str, dict]:
+        """
+        Internal method for handling a metadata response.
+        :param url: Requested URL.
+        :param status_code: Response status code.
+        :param headers: Response headers.
+        :param content: Response content.
+        :return: Tuple of status and metadata, see request_metadata.
+        """
+        if status_code == 304 and self.response_cache is not None:
+            cached = self.response_cache.get(url)
+            if cached is not None:
+                self._logger.info(f"Metadata is unchanged.")
+                return "unchanged", self._parse_metadata(cached["body"].encode("utf-8"))
+        if status_code == 404:
+            self._logger.info(f"Model is unknown.")
+            return "not_found", {}
+        metadata = self._parse_metadata(content) if status_code == 200 else {}
+        if not metadata:
+            return "error", {}
+        if self.response_cache is not None:
+            self.response_cache.store(url, headers.get("ETag"), headers.get("Last-Modified"), content.decode("utf-8"))
+        return "ok", metadata
+
+    def _parse_metadata(self, content: bytes) -> dict:
+        """
+        Internal method for parsing a metadata response.
+        :param content: Response content.
+        :return: Metadata or empty dictionary, if response contained an error or could not be deserialized.
+        """
         try:
-            meta_data = json.loads(resp.content)
+            meta_data = json.loads(content)
             if meta_data is not None and not "error" in meta_data:
                 self._logger.info(f"Fetching metadata was successful.")
                 return meta_data
@@ -89,4 +406,4 @@ class CivitaiAbstractAPIWrapper(AbstractAPIWrapper):
                 self._logger.warn(f"Fetching metadata failed.")
         except json.JSONDecodeError:
                 self._logger.warn(f"Metadata response could not be deserialized.")
-                return {}
\ No newline at end of file
+        return {}
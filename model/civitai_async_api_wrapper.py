@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                model_data_handler                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import os
+import asyncio
+import threading
+import queue
+import aiohttp
+from time import perf_counter
+from logging import Logger
+from typing import Any, Optional, List, Iterator, AsyncIterator, Tuple, Callable
+from ..utility.bronze import rate_limiting_utility
+from ..configuration import configuration as cfg
+from civitai_api_wrapper import CivitaiAbstractAPIWrapper
+
+
+class CivitaiAsyncAPIWrapper(CivitaiAbstractAPIWrapper):
+    """
+    Class, representing civitai API wrapper, which resolves multiple metadata requests concurrently with asyncio.
+    """
+    def __init__(self, pool_size: int = 10, retries: int = 3, concurrency: int = 32, 
+                 rate_limiter: Optional[rate_limiting_utility.RateLimiter] = None,
+                 response_cache_folder: Optional[str] = os.path.join(cfg.PATHS.DATA_PATH, "response_cache")) -> None:
+        """
+        Initiation method.
+        :param pool_size: Size of the keep-alive connection pool for synchronous requests. Defaults to 10.
+        :param retries: Number of transport-level retries for idempotent synchronous requests. Defaults to 3.
+        :param concurrency: Maximum number of concurrent asynchronous requests. Defaults to 32.
+        :param rate_limiter: Rate limiter. Defaults to None in which case the module level rate limiter is shared.
+        :param response_cache_folder: Folder for caching metadata responses for conditional requests. 
+            Defaults to 'data/response_cache'. None disables the response cache.
+        """
+        super().__init__(pool_size, retries, rate_limiter, response_cache_folder)
+        self._logger = Logger("[CivitaiAsyncAPIWrapper]")
+        self.concurrency = concurrency
+
+    async def collect_metadata_async(self, session: aiohttp.ClientSession, identifier: str, model_id: Any) -> dict:
+        """
+        Asynchronous method for acquring model data by identifier.
+        :param session: Client session.
+        :param identifier: Type of identification.
+        :model_id: Identification of specified type.
+        :return: Metadata for given model ID.
+        """
+        return (await self.request_metadata_async(session, identifier, model_id))[1]
+
+    async def request_metadata_async(self, session: aiohttp.ClientSession, identifier: str, model_id: Any, conditional: bool = False) -> Tuple[str, dict]:
+        """
+        Asynchronous method for requesting model data by identifier with response status.
+        :param session: Client session.
+        :param identifier: Type of identification.
+        :model_id: Identification of specified type.
+        :param conditional: Flag for sending a conditional request, based on the cached response validators.
+            Defaults to False.
+        :return: Tuple of status and metadata, see request_metadata.
+            Concurrent requests for the same model are coalesced into a single request.
+        """
+        return await self.single_flight.do_async((identifier, str(model_id), conditional), 
+                                                 lambda: self._request_metadata_async(session, identifier, model_id, conditional))
+
+    async def _request_metadata_async(self, session: aiohttp.ClientSession, identifier: str, model_id: Any, conditional: bool = False) -> Tuple[str, dict]:
+        """
+        Internal asynchronous method for requesting model data by identifier with response status.
+        :param session: Client session.
+        :param identifier: Type of identification.
+        :model_id: Identification of specified type.
+        :param conditional: Flag for sending a conditional request. Defaults to False.
+        :return: Tuple of status and metadata, see request_metadata.
+        """
+        self._logger.info(f"Fetching metadata for model with '{model_id}' as '{identifier}'...")
+        url = self.get_api_url(identifier, model_id)
+        headers = self.response_cache.get_conditional_headers(url) if conditional and self.response_cache is not None else {}
+        for attempt in range(self.throttling_retries + 1):
+            await self.rate_limiter.acquire_async(url)
+            async with session.get(url, headers=headers) as resp:
+                if not self.rate_limiter.report(url, resp.status, resp.headers.get("Retry-After")) or attempt == self.throttling_retries:
+                    return self._handle_metadata_response(url, resp.status, resp.headers, await resp.read())
+                self._logger.warn(f"Request to '{url}' was throttled with status {resp.status}, retrying...")
+
+    async def request_metadata_many_async(self, identifier: str, model_ids: List[Any], conditional: bool = False,
+                                          latency_callback: Optional[Callable[[Any, float], None]] = None) -> AsyncIterator[Tuple[Any, str, dict]]:
+        """
+        Asynchronous method for requesting model data for multiple models by identifier with response status.
+        At most 'concurrency' requests are in flight, results are yielded in order of completion.
+        Model IDs are pulled lazily in a thread pool, only while a request slot is free, so that blocking producers 
+        do not stall the event loop and overlap with the requests.
+        Failed requests result in status 'error' and empty metadata.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type, may be produced lazily.
+        :param conditional: Flag for sending conditional requests. Defaults to False.
+        :param latency_callback: Callback, taking the identification and the request duration in seconds.
+            Defaults to None.
+        :return: Asynchronous iterator, yielding tuples of identification, status and metadata.
+        """
+        loop = asyncio.get_running_loop()
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(sock_connect=self.request_timeout[0], sock_read=self.request_timeout[1])
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers={"Authorization": cfg.CIVITAI_API_KEY}) as session:
+            async def fetch(model_id: Any) -> Tuple[Any, str, dict]:
+                """Fetch metadata for a single model ID."""
+                start = perf_counter()
+                try:
+                    return (model_id, *await self.request_metadata_async(session, identifier, model_id, conditional))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                    self._logger.warn(f"'{ex}' occured while fetching metadata for '{model_id}'.")
+                    return model_id, "error", {}
+                finally:
+                    if latency_callback is not None:
+                        latency_callback(model_id, perf_counter() - start)
+
+            model_id_iterator = iter(model_ids)
+            exhausted = object()
+            producer = None
+            tasks = set()
+            try:
+                while True:
+                    if producer is None and model_id_iterator is not None and len(tasks) < self.concurrency:
+                        producer = loop.run_in_executor(None, next, model_id_iterator, exhausted)
+                    if producer is None and not tasks:
+                        break
+                    done, _ = await asyncio.wait(tasks | ({producer} - {None}), return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        if future is producer:
+                            producer = None
+                            model_id = future.result()
+                            if model_id is exhausted:
+                                model_id_iterator = None
+                            else:
+                                tasks.add(asyncio.ensure_future(fetch(model_id)))
+                        else:
+                            tasks.discard(future)
+                            yield future.result()
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def collect_metadata_many_async(self, identifier: str, model_ids: List[Any]) -> AsyncIterator[Tuple[Any, dict]]:
+        """
+        Asynchronous method for acquring model data for multiple models by identifier.
+        At most 'concurrency' requests are in flight, results are yielded in order of completion.
+        Failed requests result in empty metadata.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type.
+        :return: Asynchronous iterator, yielding tuples of identification and metadata.
+        """
+        async for model_id, _, metadata in self.request_metadata_many_async(identifier, model_ids):
+            yield model_id, metadata
+
+    def request_metadata_many(self, identifier: str, model_ids: List[Any], conditional: bool = False,
+                              latency_callback: Optional[Callable[[Any, float], None]] = None) -> Iterator[Tuple[Any, str, dict]]:
+        """
+        Method for requesting model data for multiple models by identifier with response status.
+        Runs the asynchronous requests in an event loop on a background thread and streams the results back.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type.
+        :param conditional: Flag for sending conditional requests. Defaults to False.
+        :param latency_callback: Callback, taking the identification and the request duration in seconds.
+            Called from the background thread. Defaults to None.
+        :return: Iterator, yielding tuples of identification, status and metadata in order of completion.
+        """
+        results = queue.Queue()
+        stop_event = threading.Event()
+        finished = object()
+
+        async def produce() -> None:
+            """Produce results."""
+            async for result in self.request_metadata_many_async(identifier, model_ids, conditional, latency_callback):
+                results.put(result)
+                if stop_event.is_set():
+                    break
+
+        def run() -> None:
+            """Run event loop."""
+            try:
+                asyncio.run(produce())
+            except Exception as ex:
+                results.put(ex)
+            finally:
+                results.put(finished)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            for result in iter(results.get, finished):
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+        finally:
+            stop_event.set()
+            thread.join()
+
+    def collect_metadata_many(self, identifier: str, model_ids: List[Any], *args: Optional[List], **kwargs: Optional[dict]) -> Iterator[Tuple[Any, dict]]:
+        """
+        Method for acquring model data for multiple models by identifier.
+        Runs the asynchronous requests in an event loop on a background thread and streams the results back.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type.
+        :param args: Arbitrary arguments.
+        :param kwargs: Arbitrary keyword arguments.
+        :return: Iterator, yielding tuples of identification and metadata in order of completion.
+        """
+        for model_id, _, metadata in self.request_metadata_many(identifier, model_ids):
+            yield model_id, metadata
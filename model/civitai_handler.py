@@ -6,18 +6,24 @@
 ****************************************************
 """
 import os
+import json
 import shutil
 import copy
+import itertools
+import functools
 import requests
 import numpy
 import traceback
-from time import sleep
+import threading
+import queue
+from time import sleep, time
 from logging import Logger
-from typing import Any, Optional, List
+from urllib.parse import urlparse
+from typing import Any, Optional, List, Generator, Iterator, Tuple
 from abstract_handler import AbstractHandler
 from civitai_api_wrapper import CivitaiAbstractAPIWrapper
-from ..utility.bronze import hashing_utility, dictionary_utility
-from ..utility.silver import image_utility, internet_utility
+from ..utility.bronze import hashing_utility, dictionary_utility, json_utility, safetensors_utility, download_manager_utility, asset_store_utility, single_flight_utility
+from ..utility.silver import image_utility, internet_utility, file_system_utility
 from ..configuration import configuration as cfg
 
 
@@ -33,55 +39,384 @@ class CivitaiHandler(AbstractHandler):
         self.nsfw_image_score_threshold = 0.3
         self._logger = Logger("[CivitaiHandler]")
         self.standard_img_widths = [1080, 720, 576, 480]
+        self._resolution_support_lock = threading.Lock()
+        self.asset_store = None
+        self._asset_single_flight = single_flight_utility.SingleFlight()
+        self.hashing_workers = None
+        self.hashing_buffer_size = hashing_utility.DEFAULT_BUFFER_SIZE
+        self.hashing_io_mode = "fadvise"
+        self.metrics_folder = os.path.join(cfg.PATHS.DATA_PATH, "metrics")
+        self.pipeline_settings = {
+            "enabled": False,
+            "api_workers": 4,
+            "hash_queue_size": 16,
+            "record_queue_size": 16
+        }
+        self.api.set_pool_size(max(self.api.pool_size, self.pipeline_settings["api_workers"]))
+        self.download_settings = {
+            "workers": 8,
+            "chunk_size": 16*1024*1024,
+            "asset_workers": 8,
+            "asset_per_host_limit": 4,
+            "asset_retries": 3
+        }
+        self.negative_cache_settings = {
+            "not_found_ttl": 24*60*60,
+            "error_ttl": 15*60,
+            "backoff_factor": 2.0,
+            "max_ttl": 30*24*60*60
+        }
 
     def load_model_folder(self, model_folder: str, *args: Optional[List], **kwargs: Optional[dict]) -> None:
         """
         Method for loading model folder.
+        The folder is scanned incrementally, only added, removed or modified model files are processed.
+        The scan state is only updated after the changes were processed, so that failed runs are repeated.
         :param model_folder: Model folder.
         :param args: Arbitrary arguments.
         :param kwargs: Arbitrary keyword arguments.
+            'hashing_workers': Number of hashing processes. Defaults to the handler's 'hashing_workers' attribute.
+            'full_rescan': Flag for discarding the scan state and rebuilding the model lists. Defaults to False.
+            'check_files': Flag for stat'ing known model files in unchanged folders. Defaults to False.
+            'pipelined': Flag for overlapping hashing, metadata collection and record building.
+                Defaults to the 'enabled' entry of the handler's 'pipeline_settings' attribute.
+            'recheck_unknown': Flag for looking up hashes again, even if they are known to be unknown. Defaults to False.
         """
         self._logger.info(f"Loading model folders under '{model_folder}'...")
-        self.cache["local_models"] = []
-        self.cache["tracked"] = []
-        self.cache["not_tracked"] = []
-        self.cache["ignored"] = []
-        for root, _, files in os.walk(model_folder, topdown=True):
-            self._logger.info(f"Checking '{root}'...")
-            ignored_subfolder = False
-            if any(subfolder in cfg.IGNORE_MODEL_SUBFOLDERS for subfolder in root.replace(model_folder, "").split("/")):
-                ignored_subfolder = True
-            for model_file in self.extract_model_files(files):
-                self._logger.info(f"Found '{model_file}'.")
-                full_model_path = os.path.join(root, model_file)
-                if full_model_path not in self.cache["tracked"]:
-                    if model_file not in cfg.IGNORE_MODEL_FILES and not ignored_subfolder:
-                        self._logger.info(f"'{model_file}' is not tracked, collecting data...")
-                        self._logger.info(f"Loading '{root}'...")
-                        _, file_ext = os.path.splitext(model_file)
-                        model_data = {
-                            "file": model_file,
-                            "extension": file_ext,
-                            "path": full_model_path,
-                            "sha256": hashing_utility.hash_with_sha256(full_model_path),
-                            "status": "found"
-                        }
-                        api_data = self.collect_metadata("hash", model_data["sha256"])
-                        if api_data:
-                            model_data["metadata"] = api_data
-                            model_data["api_url"] = self.api.get_api_url("hash", model_data["sha256"])
-                            model_data["source"] = self.api.base_url
-                            model_data["status"] = "collected"
-                            self.cache["local_models"].append(copy.deepcopy(model_data))
-                            self.cache["tracked"].append(full_model_path)
-                        else:
-                            self._logger.info(f"Could not load metadata, handler will not track '{model_file}'.")
-                            self.cache["not_tracked"].append(full_model_path)
+        self.reset_metrics()
+        with self.metrics.measure("phase_total"):
+            folder_prefix = os.path.join(model_folder, "")
+            scan_state = copy.deepcopy(self.cache.setdefault("scan_states", {}).get(model_folder, {}))
+            if kwargs.get("full_rescan", False) or not scan_state:
+                self._logger.info(f"Running full scan for '{model_folder}'...")
+                for list_key in ["tracked", "not_tracked", "ignored"]:
+                    self.cache.setdefault(list_key, [])
+                self.cache.setdefault("local_models", [])
+                self._forget_model_files([path for list_key in ["tracked", "not_tracked", "ignored"] 
+                                          for path in self.cache[list_key] if path.startswith(folder_prefix)])
+                scan_state.clear()
+            with self.metrics.measure("phase_scan"):
+                changes = file_system_utility.scan_files_incrementally(model_folder, scan_state, 
+                                                                       lambda file: bool(self.extract_model_files([file])), 
+                                                                       kwargs.get("check_files", False))
+            self._logger.info(f"Found {len(changes['added'])} added, {len(changes['removed'])} removed and {len(changes['modified'])} modified model files.")
+            for change_type in changes:
+                self.metrics.increment(f"{change_type}_files", len(changes[change_type]))
+            if changes["removed"] or changes["modified"]:
+                self._forget_model_files(changes["removed"] + changes["modified"])
+                self.prune_hash_index(model_folder, changes["removed"] + changes["modified"])
+            
+            retried = [path for path in self.cache["not_tracked"] if path.startswith(folder_prefix)]
+            self._forget_model_files(retried)
+            self._load_model_files(model_folder, changes["added"] + changes["modified"] + retried, 
+                                   kwargs.get("hashing_workers", self.hashing_workers), kwargs.get("pipelined"),
+                                   kwargs.get("recheck_unknown", False))
+            self.cache["scan_states"][model_folder] = scan_state
+            with self.metrics.measure("phase_model_resolution"):
+                self.resolve_model_metadata()
+        self._logger.info(f"Run summary: {json.dumps(self.dump_metrics('load_model_folder'))}")
+
+    def _load_model_files(self, model_folder: str, file_paths: List[str], hashing_workers: Optional[int] = None, 
+                          pipelined: Optional[bool] = None, recheck_unknown: bool = False) -> None:
+        """
+        Internal method for loading model files.
+        :param model_folder: Model folder, the files are located in.
+        :param file_paths: Model file paths.
+        :param hashing_workers: Number of hashing processes. Defaults to None in which case the CPU count is used.
+        :param pipelined: Flag for running the scan pipeline. 
+            Defaults to None in which case the handler's 'pipeline_settings' decide.
+        :param recheck_unknown: Flag for looking up hashes, even if they are known to be unknown. Defaults to False.
+        """
+        tracked = set(self.cache["tracked"])
+        files_to_hash = []
+        hashes = []
+        for full_model_path in file_paths:
+            root, model_file = os.path.split(full_model_path)
+            self._logger.info(f"Found '{model_file}'.")
+            if full_model_path not in tracked:
+                if model_file not in cfg.IGNORE_MODEL_FILES and not any(subfolder in cfg.IGNORE_MODEL_SUBFOLDERS for subfolder in root.replace(model_folder, "").split("/")):
+                    self._logger.info(f"'{model_file}' is not tracked, checking hash index...")
+                    indexed_hashes = self.get_indexed_hash(full_model_path)
+                    if indexed_hashes is None:
+                        files_to_hash.append(full_model_path)
                     else:
-                        self._logger.info(f"Ignoring '{model_file}'.")
-                        self.cache["ignored"].append(full_model_path)
+                        hashes.append((full_model_path, indexed_hashes))
                 else:
-                    self._logger.info(f"'{model_file}' is already tracked.")
+                    self._logger.info(f"Ignoring '{model_file}'.")
+                    self.cache["ignored"].append(full_model_path)
+            else:
+                self._logger.info(f"'{model_file}' is already tracked.")
+
+        self._logger.info(f"Found {len(hashes)} indexed model files, hashing {len(files_to_hash)} model files...")
+        hashed_files = self._skip_unhashed_files(itertools.chain(hashes, self._hash_and_index(files_to_hash, hashing_workers)))
+        if not recheck_unknown:
+            hashed_files = self._skip_known_unknown_hashes(hashed_files)
+        with self.metrics.measure("phase_hashing_and_collection"):
+            if self.pipeline_settings["enabled"] if pipelined is None else pipelined:
+                self._run_scan_pipeline(hashed_files)
+            else:
+                files_by_hash = {}
+                collected = {}
+                records_lock = threading.RLock()
+                hashed_file_iterator = iter(hashed_files)
+
+                def distinct_hashes() -> Generator[str, None, None]:
+                    """Yield each hash once, as soon as it is hashed, hashing under the records lock."""
+                    while True:
+                        with records_lock:
+                            hashed_file = next(hashed_file_iterator, None)
+                            if hashed_file is None:
+                                return
+                            full_model_path, file_hashes = hashed_file
+                            sha256 = file_hashes["SHA256"].lower()
+                            if sha256 in collected:
+                                self._add_model_record(full_model_path, file_hashes, copy.deepcopy(collected[sha256]))
+                                continue
+                            elif sha256 in files_by_hash:
+                                files_by_hash[sha256].append((full_model_path, file_hashes))
+                                continue
+                            files_by_hash[sha256] = [(full_model_path, file_hashes)]
+                        yield sha256
+
+                for sha256, api_data in self._collect_metadata_many(distinct_hashes()):
+                    with records_lock:
+                        collected[sha256] = api_data
+                        for full_model_path, file_hashes in files_by_hash.pop(sha256):
+                            self._add_model_record(full_model_path, file_hashes, copy.deepcopy(api_data))
+                self._logger.info(f"Collected data for {len(collected)} distinct hashes.")
+
+    def _run_scan_pipeline(self, hashed_files: Iterator[Tuple[str, dict]]) -> None:
+        """
+        Internal method for running hashing, metadata collection and record building as pipeline.
+        The stages are connected by bounded queues, so that a slow stage throttles the stages in front of it.
+        :param hashed_files: Iterator, yielding tuples of file path and Civitai hashes.
+        """
+        api_workers = self.pipeline_settings["api_workers"]
+        self.api.set_pool_size(max(self.api.pool_size, api_workers))
+        hash_queue = queue.Queue(maxsize=self.pipeline_settings["hash_queue_size"])
+        record_queue = queue.Queue(maxsize=self.pipeline_settings["record_queue_size"])
+        stop_event = threading.Event()
+        exceptions = []
+
+        def put(target_queue: queue.Queue, item: Any) -> bool:
+            """Put item into queue, unless pipeline was stopped."""
+            while not stop_event.is_set():
+                try:
+                    target_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(source_queue: queue.Queue) -> Any:
+            """Get item from queue, returns None if pipeline was stopped."""
+            while not stop_event.is_set():
+                try:
+                    return source_queue.get(timeout=0.5)
+                except queue.Empty:
+                    pass
+
+        def hashing_stage() -> None:
+            """Hashing stage."""
+            try:
+                for hashed_file in hashed_files:
+                    if not put(hash_queue, hashed_file):
+                        break
+            except Exception as ex:
+                exceptions.append(ex)
+            finally:
+                for _ in range(api_workers):
+                    put(hash_queue, None)
+
+        def api_stage() -> None:
+            """Metadata collection stage."""
+            try:
+                for full_model_path, file_hashes in iter(lambda: get(hash_queue), None):
+                    self._logger.info(f"Collecting data for '{full_model_path}'...")
+                    api_data = copy.deepcopy(self._collect_metadata(file_hashes["SHA256"].lower()))
+                    if not put(record_queue, (full_model_path, file_hashes, api_data)):
+                        break
+            except Exception as ex:
+                exceptions.append(ex)
+            finally:
+                put(record_queue, None)
+
+        threads = [threading.Thread(target=hashing_stage, daemon=True)] + [threading.Thread(target=api_stage, daemon=True) for _ in range(api_workers)]
+        for thread in threads:
+            thread.start()
+        finished_api_workers = 0
+        try:
+            while finished_api_workers < api_workers:
+                item = record_queue.get()
+                if item is None:
+                    finished_api_workers += 1
+                else:
+                    self._add_model_record(*item)
+        finally:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+        if exceptions:
+            raise exceptions[0]
+
+    def _skip_unhashed_files(self, hashed_files: Iterator[Tuple[str, Optional[dict]]]) -> Generator[Tuple[str, dict], None, None]:
+        """
+        Internal method for filtering out files, which could not be hashed.
+        Filtered files are added as not tracked and retried on the next scan.
+        :param hashed_files: Iterator, yielding tuples of file path and Civitai hashes or None.
+        :return: Generator, yielding tuples of file path and Civitai hashes.
+        """
+        for full_model_path, file_hashes in hashed_files:
+            if file_hashes is None:
+                self.cache["not_tracked"].append(full_model_path)
+            else:
+                yield full_model_path, file_hashes
+
+    def _skip_known_unknown_hashes(self, hashed_files: Iterator[Tuple[str, dict]]) -> Generator[Tuple[str, dict], None, None]:
+        """
+        Internal method for filtering out files with hashes, which are known to be unknown and not due for a re-check.
+        Filtered files are directly added as not tracked.
+        :param hashed_files: Iterator, yielding tuples of file path and Civitai hashes.
+        :return: Generator, yielding tuples of file path and Civitai hashes, which should be looked up.
+        """
+        negative_lookups = self.cache.setdefault("negative_lookups", {})
+        now = time()
+        for full_model_path, file_hashes in hashed_files:
+            entry = negative_lookups.get(file_hashes["SHA256"].lower())
+            if entry is not None and entry["recheck_after"] > now:
+                self.metrics.increment("negative_cache_hits")
+                self._logger.info(f"'{os.path.basename(full_model_path)}' is known to be unknown, skipping lookup.")
+                self._add_model_record(full_model_path, file_hashes, None)
+            else:
+                yield full_model_path, file_hashes
+
+    def _collect_metadata(self, sha256: str) -> dict:
+        """
+        Internal method for collecting metadata by hash and tracking unsuccessful lookups.
+        :param sha256: SHA256 hash.
+        :return: Metadata.
+        """
+        with self.metrics.measure("api_latency"):
+            status, metadata = self.api.request_metadata("hash", sha256)
+        self._record_lookup(sha256, status)
+        return metadata
+
+    def _collect_metadata_many(self, sha256s: Iterator[str]) -> Iterator[Tuple[str, dict]]:
+        """
+        Internal method for collecting metadata for multiple hashes and tracking unsuccessful lookups.
+        :param sha256s: SHA256 hashes, may be produced lazily.
+        :return: Iterator, yielding tuples of hash and metadata, potentially in order of completion.
+        """
+        for sha256, status, metadata in self._request_metadata_many("hash", sha256s):
+            self._record_lookup(sha256, status)
+            yield sha256, metadata
+
+    def _request_metadata_many(self, identifier: str, model_ids: Iterator[Any], 
+                               conditional: bool = False) -> Iterator[Tuple[Any, str, dict]]:
+        """
+        Internal method for requesting metadata for multiple models with response status and recording API metrics.
+        The latency of each request is recorded as 'api_latency'.
+        :param identifier: Type of identification.
+        :param model_ids: Identifications of specified type, may be produced lazily.
+        :param conditional: Flag for sending conditional requests. Defaults to False.
+        :return: Iterator, yielding tuples of identification, status and metadata, potentially in order of completion.
+        """
+        with self.metrics.measure("api_batch_duration"):
+            for model_id, status, metadata in self.api.request_metadata_many(identifier, model_ids, conditional=conditional,
+                                                                             latency_callback=self._record_api_latency):
+                self.metrics.increment("api_batch_requests")
+                yield model_id, status, metadata
+
+    def _record_api_latency(self, model_id: Any, seconds: float) -> None:
+        """
+        Internal method for recording the latency of a single API request.
+        :param model_id: Requested identification.
+        :param seconds: Request duration in seconds.
+        """
+        self.metrics.record_timing("api_latency", seconds)
+
+    def _record_lookup(self, sha256: str, status: str) -> None:
+        """
+        Internal method for tracking the result of a hash lookup in the negative lookup cache.
+        Unknown hashes and failed lookups are tracked separately, with exponentially growing re-check intervals.
+        :param sha256: SHA256 hash.
+        :param status: Lookup status, see the API wrapper's request_metadata method.
+        """
+        negative_lookups = self.cache.setdefault("negative_lookups", {})
+        if status in ["ok", "unchanged"]:
+            negative_lookups.pop(sha256, None)
+            return
+        self.metrics.increment(f"lookup_{status}")
+        entry = negative_lookups.get(sha256)
+        if entry is None or entry["reason"] != status:
+            entry = {"reason": status, "attempts": 0}
+            negative_lookups[sha256] = entry
+        entry["attempts"] += 1
+        ttl = self.negative_cache_settings[f"{'not_found' if status == 'not_found' else 'error'}_ttl"]
+        ttl = min(ttl * self.negative_cache_settings["backoff_factor"] ** (entry["attempts"] - 1), 
+                  self.negative_cache_settings["max_ttl"])
+        entry["last_checked"] = time()
+        entry["recheck_after"] = entry["last_checked"] + ttl
+
+    def _add_model_record(self, full_model_path: str, file_hashes: dict, api_data: Optional[dict]) -> None:
+        """
+        Internal method for adding a model record to the cache.
+        :param full_model_path: Model file path.
+        :param file_hashes: Civitai hashes of the model file.
+        :param api_data: Metadata, collected from the API.
+        """
+        model_file = os.path.basename(full_model_path)
+        _, file_ext = os.path.splitext(model_file)
+        model_data = {
+            "file": model_file,
+            "extension": file_ext,
+            "path": full_model_path,
+            "sha256": file_hashes["SHA256"].lower(),
+            "hashes": file_hashes,
+            "status": "found"
+        }
+        if api_data:
+            self.metrics.increment("collected_models")
+            model_data["metadata"] = api_data
+            model_data["api_url"] = self.api.get_api_url("hash", model_data["sha256"])
+            model_data["source"] = self.api.base_url
+            model_data["status"] = "collected"
+            self.cache["local_models"].append(model_data)
+            self.cache["tracked"].append(full_model_path)
+        else:
+            self.metrics.increment("not_tracked_models")
+            self._logger.info(f"Could not load metadata, handler will not track '{model_file}'.")
+            self.cache["not_tracked"].append(full_model_path)
+
+    def _forget_model_files(self, file_paths: List[str]) -> None:
+        """
+        Internal method for removing model files from the cached model lists.
+        :param file_paths: Model file paths.
+        """
+        file_paths = set(file_paths)
+        for list_key in ["tracked", "not_tracked", "ignored"]:
+            self.cache[list_key] = [path for path in self.cache[list_key] if path not in file_paths]
+        self.cache["local_models"] = [entry for entry in self.cache["local_models"] if entry["path"] not in file_paths]
+        for file_path in file_paths:
+            self.cache.get("untracked_local_metadata", {}).pop(file_path, None)
+    
+    def _hash_and_index(self, file_paths: List[str], hashing_workers: Optional[int] = None) -> Generator[Tuple[str, dict], None, None]:
+        """
+        Internal method for hashing files in parallel and adding the results to the hash index.
+        :param file_paths: File paths.
+        :param hashing_workers: Number of hashing processes. Defaults to None in which case the CPU count is used.
+        :return: Generator, yielding tuples of file path and Civitai hashes.
+            The hashes are None, if the file could not be read.
+        """
+        hash_function = functools.partial(hashing_utility.hash_with_multiple_digests, 
+                                          buffer_size=self.hashing_buffer_size, 
+                                          io_mode=self.hashing_io_mode)
+        for file_path, file_hashes in hashing_utility.hash_files_in_parallel(file_paths, hashing_workers, hash_function, 
+                                                                             self.record_hashing_statistics,
+                                                                             self.record_hashing_error):
+            if file_hashes is not None:
+                self.index_hash(file_path, file_hashes)
+            yield file_path, file_hashes
     
     def extract_model_files(self, files: List[str]) -> List[str]:
         """
@@ -94,35 +429,90 @@ class CivitaiHandler(AbstractHandler):
     def update_metadata(self, *args: Optional[List], **kwargs: Optional[dict]) -> None:
         """
         Method for updating cached metadata.
+        Metadata is refreshed with conditional requests, unchanged metadata is neither transferred nor compared.
         :param args: Arbitrary arguments.
         :param kwargs: Arbitrary keyword arguments.
         """
+        models_by_hash = {}
         for model in self.cache["local_models"]:
-            self._logger.info(f"Updating '{model['file']}' metadata.")
-            metadata = self.collect_metadata("hash", model["sha256"])
-            if metadata and not dictionary_utility.check_equality(model["metadata"], metadata):
-                self._logger.info(f"Changes detected for '{model['file']}', updating...")
-                model["metadata"] = copy.deepcopy(metadata)
+            models_by_hash.setdefault(model["sha256"], []).append(model)
+        for sha256, status, metadata in self._request_metadata_many("hash", list(models_by_hash), conditional=True):
+            self.metrics.increment(f"metadata_{status}")
+            if status == "unchanged":
+                continue
+            for model in models_by_hash[sha256]:
+                self._logger.info(f"Updating '{model['file']}' metadata.")
+                if metadata and not dictionary_utility.check_equality(model["metadata"], metadata):
+                    self._logger.info(f"Changes detected for '{model['file']}', updating...")
+                    model["metadata"] = copy.deepcopy(metadata)
+        self.resolve_model_metadata(refresh=True)
+
+    def resolve_model_metadata(self, *args: Optional[List], **kwargs: Optional[dict]) -> None:
+        """
+        Method for resolving model level metadata.
+        Local models are mapped to their Civitai model IDs via their version metadata, each model is fetched 
+        once and the shared model document is attached to all matching local models as 'model_metadata'.
+        :param args: Arbitrary arguments.
+        :param kwargs: Arbitrary keyword arguments.
+            'refresh': Flag for refreshing already resolved models with conditional requests. Defaults to False.
+        """
+        refresh = kwargs.get("refresh", False)
+        models_by_id = {}
+        for model in self.cache["local_models"]:
+            model_id = model.get("metadata", {}).get("modelId")
+            if model_id is not None and (refresh or "model_metadata" not in model):
+                models_by_id.setdefault(str(model_id), []).append(model)
+        self._logger.info(f"Resolving {len(models_by_id)} distinct models for {sum(len(models) for models in models_by_id.values())} local models...")
+        for model_id, status, model_metadata in self._request_metadata_many("id", list(models_by_id), conditional=refresh):
+            self.metrics.increment(f"model_metadata_{status}")
+            if model_metadata:
+                for model in models_by_id[model_id]:
+                    model["model_id"] = model_id
+                    model["model_metadata"] = model_metadata
+            else:
+                self._logger.warn(f"Could not resolve model '{model_id}' ({status}).")
 
     def calculate_local_metadata(self, *args: Optional[List], **kwargs: Optional[dict]) -> None:
         """
         Method for calculating local cached metadata.
         :param args: Arbitrary arguments.
         :param kwargs: Arbitrary keyword arguments.
+            'file_paths': Model file paths to restrict calculation to. Defaults to None in which case all models are handled.
         """
-        for model in [m for m in self.cache["local_models"] if "metadata" in m]:
+        file_paths = kwargs.get("file_paths")
+        for model in [m for m in self.cache["local_models"] if file_paths is None or m["path"] in file_paths]:
+            if model["extension"] == ".safetensors" and "safetensors" not in model.get("local_metadata", {}):
+                model["local_metadata"] = model.get("local_metadata", {})
+                model["local_metadata"]["safetensors"] = self._summarize_safetensors_header(model["path"])
+        untracked_local_metadata = self.cache.setdefault("untracked_local_metadata", {})
+        for path in [p for p in self.cache.get("not_tracked", []) if p.endswith(".safetensors") and (file_paths is None or p in file_paths)]:
+            if path not in untracked_local_metadata:
+                untracked_local_metadata[path] = {"safetensors": self._summarize_safetensors_header(path)}
+
+        for model in [m for m in self.cache["local_models"] if "model_metadata" in m and (file_paths is None or m["path"] in file_paths)]:
             self._logger.info(f"Calculating local metadata for '{model['file']}'...")
             model["local_metadata"] = model.get("local_metadata", {})
             model["local_metadata"]["nsfw"] = model["local_metadata"].get("nsfw", 
-                                                                          {"model": model["metadata"]["nsfw"],
+                                                                          {"model": model["model_metadata"].get("nsfw", False),
                                                                            "image_score": self._calculate_image_nsfw_score(model)})
             if "ssot" not in model["local_metadata"]["nsfw"]:
-                model["local_metadata"]["nsfw"]["ssot"] = model["local_metadata"]["nsfw"]["model"] or model["local_metadata"]["nsfw"]["image_score"] >= self.nsfw_image_score_threshold
+                model["local_metadata"]["nsfw"]["ssot"] = model["local_metadata"]["nsfw"]["model"] or (model["local_metadata"]["nsfw"]["image_score"] or 0.0) >= self.nsfw_image_score_threshold
             
-            model["local_metadata"]["tags"] = model["metadata"].get("tags", {}).values()
+            model["local_metadata"]["tags"] = list(model["model_metadata"].get("tags", []))
             model["local_metadata"]["main_tag"] = self._calculate_main_tag(model)
             model["status"] = "qual"
 
+    def _summarize_safetensors_header(self, file_path: str) -> Optional[dict]:
+        """
+        Internal method for summarizing the header of a safetensors file.
+        :param file_path: File path.
+        :return: Header summary or None, if header could not be read.
+        """
+        try:
+            return safetensors_utility.summarize_file(file_path)
+        except (OSError, ValueError) as ex:
+            self._logger.warn(f"Could not read safetensors header of '{file_path}': '{ex}'.")
+
     def organize_models(self, *args: Optional[List], **kwargs: Optional[dict]) -> None:
         """
         Method for organizing local models.
@@ -136,6 +526,151 @@ class CivitaiHandler(AbstractHandler):
                     self._sort_model(os.path.join(root, file), profile)
 
     
+    def find_duplicates(self, model_folder: str, action: Optional[str] = None, sample_size: int = 64*1024, 
+                        report_path: Optional[str] = None) -> dict:
+        """
+        Method for finding duplicate model files.
+        Files are grouped by size, then by a hash over samples of their head, middle and tail.
+        Only files in candidate groups are fully hashed (or looked up in the hash index).
+        Files, which cannot be read, are skipped.
+        :param model_folder: Model folder.
+        :param action: Action to take for duplicates. Defaults to None in which case only the report is created.
+            'hardlink': Replace duplicates by hardlinks to the kept file.
+            'delete': Delete duplicates.
+            The kept file is a tracked file, if possible, else the file with the shortest path.
+        :param sample_size: Size of each sample in bytes. Defaults to 64 KiB.
+        :param report_path: Path for saving the report as JSON. Defaults to None.
+        :return: Duplicate report.
+        """
+        self._logger.info(f"Searching for duplicates under '{model_folder}'...")
+        size_groups = {}
+        inodes = set()
+        for root, _, files in os.walk(model_folder, topdown=True):
+            for model_file in self.extract_model_files(files):
+                file_path = os.path.join(root, model_file)
+                try:
+                    file_stat = os.stat(file_path)
+                except OSError as ex:
+                    self.record_hashing_error(file_path, ex)
+                    continue
+                if (file_stat.st_dev, file_stat.st_ino) not in inodes:
+                    inodes.add((file_stat.st_dev, file_stat.st_ino))
+                    size_groups.setdefault(file_stat.st_size, []).append(file_path)
+
+        sample_groups = {}
+        for size in [size for size in size_groups if len(size_groups[size]) > 1]:
+            for file_path in size_groups[size]:
+                try:
+                    sample_groups.setdefault(hashing_utility.hash_samples(file_path, sample_size), []).append(file_path)
+                except OSError as ex:
+                    self.record_hashing_error(file_path, ex)
+        candidates = [file_path for sample_hash in sample_groups if len(sample_groups[sample_hash]) > 1 for file_path in sample_groups[sample_hash]]
+        self._logger.info(f"Found {len(candidates)} duplicate candidates.")
+
+        hash_groups = {}
+        files_to_hash = []
+        for file_path in candidates:
+            try:
+                indexed_hashes = self.get_indexed_hash(file_path)
+            except OSError as ex:
+                self.record_hashing_error(file_path, ex)
+                continue
+            if indexed_hashes is None:
+                files_to_hash.append(file_path)
+            else:
+                hash_groups.setdefault(indexed_hashes["SHA256"], []).append(file_path)
+        for file_path, file_hashes in self._hash_and_index(files_to_hash, self.hashing_workers):
+            if file_hashes is not None:
+                hash_groups.setdefault(file_hashes["SHA256"], []).append(file_path)
+
+        tracked = set(self.cache.get("tracked", []))
+        report = {"duplicates": [], "wasted_bytes": 0, "action": action}
+        for sha256 in [sha256 for sha256 in hash_groups if len(hash_groups[sha256]) > 1]:
+            files = sorted(hash_groups[sha256], key=lambda file_path: (file_path not in tracked, len(file_path)))
+            size = os.path.getsize(files[0])
+            report["duplicates"].append({"sha256": sha256.lower(), "size": size, "kept": files[0], "duplicates": files[1:]})
+            report["wasted_bytes"] += size * (len(files) - 1)
+        self._logger.info(f"Found {len(report['duplicates'])} duplicate groups, wasting {report['wasted_bytes']} bytes.")
+
+        if action in ["hardlink", "delete"]:
+            for group in report["duplicates"]:
+                self._resolve_duplicates(group["kept"], group["duplicates"], action)
+        elif action is not None:
+            self._logger.warn(f"Duplicate action '{action}' is unknown.")
+        if report_path is not None:
+            json_utility.save(report, report_path)
+        return report
+
+    def _resolve_duplicates(self, kept_path: str, duplicate_paths: List[str], action: str) -> None:
+        """
+        Internal method for resolving duplicates of a model file.
+        :param kept_path: Path of the kept model file.
+        :param duplicate_paths: Paths of the duplicates.
+        :param action: Action to take, either 'hardlink' or 'delete'.
+        """
+        file_hashes = self.get_indexed_hash(kept_path)
+        for duplicate_path in duplicate_paths:
+            try:
+                if action == "hardlink":
+                    temporary_path = f"{duplicate_path}.dedup"
+                    os.link(kept_path, temporary_path)
+                    os.replace(temporary_path, duplicate_path)
+                    if file_hashes is not None:
+                        self.index_hash(duplicate_path, file_hashes)
+                    self._logger.info(f"Replaced '{duplicate_path}' by hardlink to '{kept_path}'.")
+                else:
+                    os.remove(duplicate_path)
+                    self._forget_model_files([duplicate_path])
+                    self._logger.info(f"Deleted '{duplicate_path}', keeping '{kept_path}'.")
+            except OSError as ex:
+                self._logger.warn(f"Could not resolve duplicate '{duplicate_path}': '{ex}'.")
+
+    def watch_model_folder(self, model_folder: str, debounce: float = 5.0, organize: bool = True, 
+                           stop_event: Optional[threading.Event] = None) -> None:
+        """
+        Method for watching the model folder and the staging folders for changes.
+        Only changed files are hashed, looked up and (if they are located in a staging folder) sorted.
+        Blocks until the stop event is set or the process is interrupted.
+        :param model_folder: Model folder.
+        :param debounce: Time in seconds, a file has to be quiet before being processed. Defaults to 5.0 seconds.
+        :param organize: Flag for sorting new models in staging folders. Defaults to True.
+        :param stop_event: Event for stopping the watch mode. Defaults to None.
+        """
+        staging_folders = [cfg.DICTS.CIVITAI_FOLDER_STRUCTURE[model_type]["staging_folder"] for model_type in cfg.DICTS.CIVITAI_FOLDER_STRUCTURE]
+        self._logger.info(f"Watching '{model_folder}' and {len(staging_folders)} staging folders...")
+        file_system_utility.watch_folders([model_folder] + staging_folders, 
+                                          lambda changed, removed: self._handle_watched_changes(model_folder, changed, removed, organize),
+                                          debounce,
+                                          lambda file: bool(self.extract_model_files([file])),
+                                          stop_event)
+
+    def _handle_watched_changes(self, model_folder: str, changed: List[str], removed: List[str], organize: bool) -> None:
+        """
+        Internal method for handling changes, reported by the watch mode.
+        Tracked files are only handled as modified, if their indexed identity changed, so moved files keep their records.
+        :param model_folder: Model folder.
+        :param changed: Changed file paths.
+        :param removed: Removed file paths.
+        :param organize: Flag for sorting new models in staging folders.
+        """
+        self._logger.info(f"Handling {len(changed)} changed and {len(removed)} removed model files...")
+        known_paths = set(self.cache.get("tracked", []))
+        indexed_paths = {entry["path"] for entry in self.cache.get("hash_index", {}).values()}
+        modified = [path for path in changed if self.get_indexed_hash(path) is None 
+                    and (path not in known_paths or path in indexed_paths)]
+        self._forget_model_files(removed + modified)
+        self.prune_hash_index("", removed + modified)
+        self._load_model_files(model_folder, changed, self.hashing_workers)
+        self.calculate_local_metadata(file_paths=changed)
+        if organize:
+            tracked = set(self.cache["tracked"])
+            for path in [path for path in changed if path in tracked]:
+                for profile in [cfg.DICTS.CIVITAI_FOLDER_STRUCTURE[model_type] for model_type in cfg.DICTS.CIVITAI_FOLDER_STRUCTURE]:
+                    if path not in self.cache["tracked"]:
+                        break
+                    if path.startswith(os.path.join(profile["staging_folder"], "")):
+                        self._sort_model(path, profile)
+
     def reorganize_models(self, *args: Optional[List], **kwargs: Optional[dict]) -> None:
         """
         Method for reorganizing local models.
@@ -173,70 +708,357 @@ class CivitaiHandler(AbstractHandler):
         else:
             self._logger.warn(f"'{file_path}' is not tracked.")
 
-    def _download_model_cover(self, model_entry: dict) -> None:
+    def download_model_covers(self, *args: Optional[List], **kwargs: Optional[dict]) -> dict:
+        """
+        Method for downloading the cover images of all tracked models concurrently.
+        :param args: Arbitrary arguments.
+        :param kwargs: Arbitrary keyword arguments.
+            'model_entries': Model entries to download covers for. Defaults to all local models.
+            'overwrite': Flag for downloading covers, which already exist. Stored covers are evicted from the asset store
+                and downloaded again. Defaults to False.
+        :return: Download report, see download_manager_utility.DownloadManager.run.
+        """
+        jobs = []
+        for model_entry in kwargs.get("model_entries", self.cache["local_models"]):
+            cover_path = self._get_model_cover_path(model_entry)
+            if cover_path is not None and (kwargs.get("overwrite", False) or not os.path.exists(cover_path)):
+                jobs.append(self._download_model_cover(model_entry, enqueue=True))
+                key = self._get_asset_key(model_entry["metadata"]["images"][0])
+                if kwargs.get("overwrite", False) and self.asset_store is not None and key is not None:
+                    self.asset_store.remove(key)
+        self._logger.info(f"Downloading {len(jobs)} model covers...")
+        manager = download_manager_utility.DownloadManager(workers=self.download_settings["asset_workers"],
+                                                           per_host_limit=self.download_settings["asset_per_host_limit"],
+                                                           retries=self.download_settings["asset_retries"])
+        with self.metrics.measure("cover_download_duration"):
+            report = manager.run(jobs, self._log_download_progress)
+        self.metrics.increment("downloaded_covers", report["succeeded"])
+        self.metrics.increment("failed_covers", len(report["failed"]))
+        for job_id, error in report["failed"].items():
+            self._logger.warn(f"Could not download cover for '{job_id}': '{error}'.")
+        return report
+
+    def audit_model_covers(self, *args: Optional[List], **kwargs: Optional[dict]) -> dict:
+        """
+        Method for auditing the cover images of all tracked models.
+        Sidecar images next to tracked models are validated over a process pool, corrupt images and missing covers
+        are reported. Files are only touched, if re-downloading is requested.
+        :param args: Arbitrary arguments.
+        :param kwargs: Arbitrary keyword arguments.
+            'workers': Number of checking processes. Defaults to the handler's 'hashing_workers' attribute.
+            'report_path': Path for saving the report as JSON. Defaults to None.
+            'redownload': Flag for deleting corrupt covers and re-downloading corrupt and missing covers. 
+                Defaults to False.
+        :return: Audit report.
+        """
+        self._logger.info("Auditing model covers...")
+        sidecars = {}
+        folder_contents = {}
+        for model_entry in self.cache["local_models"]:
+            folder, model_file = os.path.split(model_entry["path"])
+            if folder not in folder_contents:
+                folder_contents[folder] = os.listdir(folder) if os.path.isdir(folder) else []
+            stem, _ = os.path.splitext(model_file)
+            sidecars[model_entry["path"]] = [os.path.join(folder, file) for file in folder_contents[folder] 
+                                             if os.path.splitext(file)[0] == stem and os.path.splitext(file)[1].lower() in image_utility.IMAGE_EXTENSIONS]
+
+        report = {"checked": 0, "healthy": 0, "corrupt": [], "missing": [], "seconds": 0.0}
+        corrupt_models = set()
+        model_paths = {image_path: model_path for model_path in sidecars for image_path in sidecars[model_path]}
+        start = time()
+        with self.metrics.measure("cover_audit_duration"):
+            for image_path, healthy in image_utility.check_images_in_parallel(list(model_paths), kwargs.get("workers", self.hashing_workers)):
+                report["checked"] += 1
+                if healthy:
+                    report["healthy"] += 1
+                else:
+                    report["corrupt"].append(image_path)
+                    corrupt_models.add(model_paths[image_path])
+        report["missing"] = [model_path for model_path in sidecars if not sidecars[model_path]]
+        report["seconds"] = time() - start
+        self._logger.info(f"Checked {report['checked']} covers, found {len(report['corrupt'])} corrupt and {len(report['missing'])} missing covers.")
+
+        if kwargs.get("redownload", False):
+            for image_path in report["corrupt"]:
+                os.remove(image_path)
+            queued = [model_entry for model_entry in self.cache["local_models"] 
+                      if model_entry["path"] in corrupt_models or model_entry["path"] in report["missing"]]
+            report["redownload"] = self.download_model_covers(model_entries=queued, overwrite=True)
+        if kwargs.get("report_path") is not None:
+            json_utility.save(report, kwargs["report_path"])
+        return report
+
+    def _log_download_progress(self, report: dict) -> None:
+        """
+        Internal method for logging the progress of a download batch.
+        :param report: Current download report.
+        """
+        if report["finished"] == report["total"] or report["finished"] % 25 == 0:
+            self._logger.info(f"Finished {report['finished']} of {report['total']} downloads, {len(report['failed'])} failed.")
+
+    def _get_model_cover_path(self, model_entry: dict) -> Optional[str]:
+        """
+        Internal method for getting the cover image path of a model.
+        :param model_entry: Model data.
+        :return: Cover image path or None, if model has no image data.
+        """
+        if model_entry.get("metadata", {}).get("images"):
+            _, ext = os.path.splitext(model_entry["metadata"]["images"][0]["url"].split("/")[-1])
+            return model_entry["path"].replace(model_entry["extension"], ext)
+
+    def _download_model_cover(self, model_entry: dict, enqueue: bool = False) -> Optional[Tuple[str, str, Any]]:
         """
         Internal method for downloading model cover image.
         :param model_entry: Model data of model for which a cover image should be downloaded.
+        :param enqueue: Flag for returning a download job instead of downloading directly. Defaults to False.
+        :return: Download job as tuple of model path, image URL and job function, if enqueue is set, else None.
         """
-        if model_entry["metadata"]["images"]:
-            _, ext = os.path.splitext(model_entry["metadata"]["images"][0]["url"].split("/")[-1])
-            output_path = model_entry["path"].replace(model_entry["extension"], ext)
-            self.download_asset("image", model_entry["metadata"]["images"][0], output_path)
-        else:
+        output_path = self._get_model_cover_path(model_entry)
+        if output_path is None:
             self._logger.warn(f"'{model_entry['file']}' has no image data.")
+            return None
+        image_data = model_entry["metadata"]["images"][0]
+        if self.asset_store is not None and self._get_asset_key(image_data) is not None:
+            job = functools.partial(self._download_stored_asset, "image", image_data, output_path, 1)
+        else:
+            job = functools.partial(self.download_asset, "image", image_data, output_path, 1)
+        if enqueue:
+            return model_entry["path"], image_data["url"], job
+        job()
 
-    def download_model(self, *args: Optional[List], **kwargs: Optional[dict]) -> None:
+    def enable_asset_store(self, folder: str = os.path.join(cfg.PATHS.DATA_PATH, "assets"), link_mode: str = "hardlink") -> None:
+        """
+        Method for enabling the content-addressed asset store for model covers.
+        Covers are then stored once per Civitai image and linked next to the model files.
+        :param folder: Store folder. Defaults to 'data/assets'.
+        :param link_mode: Link mode, see asset_store_utility.LINK_MODES. Defaults to 'hardlink'.
+        """
+        self.asset_store = asset_store_utility.AssetStore(folder, link_mode)
+
+    def cleanup_asset_store(self) -> Optional[dict]:
+        """
+        Method for removing stored assets, which are no longer linked next to any model file.
+        :return: Cleanup report or None, if the asset store is not enabled.
+        """
+        if self.asset_store is not None:
+            return self.asset_store.cleanup()
+
+    def _get_asset_key(self, asset_data: dict) -> Optional[str]:
+        """
+        Internal method for getting the asset store key of an asset.
+        :param asset_data: Asset data.
+        :return: Asset key, based on the Civitai image ID or image hash, or None, if asset can not be identified.
+        """
+        if asset_data.get("id") is not None:
+            return f"civitai-image-{asset_data['id']}"
+        elif asset_data.get("hash"):
+            return f"civitai-image-hash-{asset_data['hash']}"
+
+    def _download_stored_asset(self, asset_type: str, asset_data: dict, output_path: str, tries: int = 3) -> bool:
+        """
+        Internal method for downloading an asset into the asset store and linking it to the output path.
+        Assets are only downloaded, if they are not stored yet. Concurrent downloads of the same asset are coalesced.
+        Stored images are validated before reuse, corrupt images are evicted and downloaded again.
+        :param asset_type: Asset type.
+        :param asset_data: Asset data.
+        :param output_path: Target output path.
+        :param tries: Number of tries, defaults to 3.
+        :return: True, if process was successful, else False.
+        """
+        key = self._get_asset_key(asset_data)
+
+        def store() -> bool:
+            """Download asset into store."""
+            blob_path = self.asset_store.get(key)
+            if blob_path is not None:
+                if asset_type != "image" or image_utility.check_image_health(blob_path):
+                    self.metrics.increment("asset_store_hits")
+                    return True
+                self._logger.warn(f"Stored asset '{blob_path}' is corrupt, downloading again...")
+                self.metrics.increment("asset_store_evictions")
+                self.asset_store.remove(key)
+            staging_path = self.asset_store.get_blob_path(key, f".download{os.path.splitext(output_path)[1]}")
+            staging_folder = os.path.dirname(staging_path)
+            if not os.path.exists(staging_folder):
+                os.makedirs(staging_folder, exist_ok=True)
+            if not self.download_asset(asset_type, asset_data, staging_path, tries):
+                return False
+            self.asset_store.add(key, staging_path)
+            return True
+
+        return self._asset_single_flight.do(key, store) and self.asset_store.link(key, output_path)
+
+    def download_model(self, model_version: Any, output_folder: str, *args: Optional[List], **kwargs: Optional[dict]) -> Optional[str]:
         """
         Method for downloading a model.
+        The model file is downloaded with parallel range requests into a partial file. The Civitai hashes are calculated
+        during the download and validated against the Civitai file metadata before the file is moved to its target path.
+        The hashes are added to the hash index, so that loading the model does not read the file again. 
+        Interrupted downloads resume.
+        :param model_version: Model version ID or model version metadata.
+        :param output_folder: Output folder.
         :param args: Arbitrary arguments.
         :param kwargs: Arbitrary keyword arguments.
+            'file_name': Name of the model version file to download. Defaults to the primary file.
+            'workers': Number of concurrent range requests. Defaults to the handler's 'download_settings'.
+            'chunk_size': Chunk size in bytes. Defaults to the handler's 'download_settings'.
+        :return: Model file path, if process was successful, else None.
         """
-        pass
+        if not isinstance(model_version, dict):
+            status, model_version = self.api.request_metadata("version", model_version)
+            if not model_version:
+                self._logger.warn(f"Could not fetch model version metadata ({status}).")
+                return None
+        files = model_version.get("files", [])
+        file_name = kwargs.get("file_name")
+        file_options = [file for file in files if file["name"] == file_name] if file_name else [file for file in files if file.get("primary")] or files[:1]
+        if not file_options:
+            self._logger.warn(f"Could not find {'file ' + repr(file_name) if file_name else 'a file'} for model version '{model_version.get('id')}'.")
+            return None
+        model_file = file_options[0]
+        output_path = os.path.join(output_folder, model_file["name"])
+        expected_hashes = model_file.get("hashes", {})
+        if os.path.exists(output_path):
+            self._logger.warn(f"'{output_path}' already exists.")
+            file_hashes = self.get_indexed_hash(output_path)
+            if file_hashes is None:
+                file_hashes = next(self._hash_and_index([output_path], 1))[1]
+            return output_path if file_hashes is not None and self._validate_hashes(file_hashes, expected_hashes) else None
+
+        partial_path = f"{output_path}.part"
+        hasher = hashing_utility.MultiHasher(safetensors=model_file["name"].endswith(".safetensors"))
+        self._logger.info(f"Downloading '{model_file['name']}' to '{output_folder}'...")
+        with self.metrics.measure("download_duration"):
+            if not self.api.download_file(model_file["downloadUrl"], partial_path, 
+                                          workers=kwargs.get("workers", self.download_settings["workers"]),
+                                          chunk_size=kwargs.get("chunk_size", self.download_settings["chunk_size"]),
+                                          hasher=hasher):
+                self._logger.warn(f"Downloading '{model_file['name']}' failed, rerun to resume.")
+                return None
+        file_hashes = hasher.hexdigests()
+        if os.path.getsize(partial_path) != hasher.get_hashed_bytes():
+            self._logger.warn(f"Downloaded '{model_file['name']}' has {os.path.getsize(partial_path)} bytes, but {hasher.get_hashed_bytes()} bytes were hashed, removing download...")
+            os.remove(partial_path)
+            return None
+        if not self._validate_hashes(file_hashes, expected_hashes):
+            self._logger.warn(f"Downloaded '{model_file['name']}' does not match its hashes, removing download...")
+            os.remove(partial_path)
+            return None
+        os.replace(partial_path, output_path)
+        self.index_hash(output_path, file_hashes)
+        self.metrics.increment("downloaded_models")
+        self.metrics.increment("downloaded_bytes", os.path.getsize(output_path))
+        return output_path
+
+    def _validate_hashes(self, file_hashes: dict, expected_hashes: dict) -> bool:
+        """
+        Internal method for validating file hashes against the expected hashes from the Civitai file metadata.
+        :param file_hashes: Calculated Civitai hashes.
+        :param expected_hashes: Expected Civitai hashes. Only hash types, which were calculated, are compared.
+            If a SHA256 hash is expected, it is authoritative. Otherwise shortened hash types are compared by prefix,
+            since Civitai may report them in a different length.
+        :return: True, if all comparable hashes match, else False.
+        """
+        comparable = [hash_type for hash_type in expected_hashes if hash_type in file_hashes and expected_hashes[hash_type]]
+        if "SHA256" in comparable:
+            comparable = ["SHA256"]
+        mismatches = []
+        for hash_type in comparable:
+            calculated, expected = file_hashes[hash_type].upper(), str(expected_hashes[hash_type]).upper()
+            if hash_type == "SHA256":
+                matches = calculated == expected
+            else:
+                matches = calculated.startswith(expected) or expected.startswith(calculated)
+            if not matches:
+                mismatches.append(hash_type)
+        for hash_type in mismatches:
+            self._logger.warn(f"{hash_type} hash '{file_hashes[hash_type]}' does not match expected '{expected_hashes[hash_type]}'.")
+        return not mismatches
 
-    def download_asset(self, asset_type: str, asset_data: dict, output_path: str, tries: int = 3) -> None:
+    def download_asset(self, asset_type: str, asset_data: dict, output_path: str, tries: int = 3) -> bool:
         """
         Method for downloading an asset.
         :param asset_type: Asset type.
         :param asset_data: Asset data.
         :param output_path: Target output path.
         :param tries: Number of tries, defaults to 3.
+        :return: True, if process was successful, else False.
         """
         if asset_type == "image":
             image_url = asset_data["url"]
             image_width = asset_data["width"]
-            self._download_image(self._image_url_for_width(image_url, image_width), output_path, tries, True)
+            return self.download_image(self._image_url_for_width(image_url, image_width), output_path, tries, True)
         else:
             self._logger.warn(f"Asset type '{asset_type}' is unknown.")
+            return False
 
-    def download_image(self, image_url: str, output_path: str, tries: int = 3, try_different_resolutions: bool = False) -> True:
+    def download_image(self, image_url: str, output_path: str, tries: int = 3, try_different_resolutions: bool = False) -> bool:
         """
         Method for downloading an image.
         :param image_url: Image URL.
         :param output_path: Target output path.
         :param tries: Number of tries, defaults to 3.
-        :param try_different_resolutions: Flag for trying different resolutions. 
-            Note, that tries then extend to <tries> * <number of resolutions> + 1.
+        :param try_different_resolutions: Flag for negotiating the resolution before downloading. 
+            If set, the best available resolution is determined with cheap probes, see plan_image_url.
         :return: True, if process was successful, else False.
         """
-        counter = 0
-        while counter < 3:
+        if try_different_resolutions:
+            image_url = self.plan_image_url(image_url)
+            if image_url is None:
+                return False
+        for counter in range(1, tries + 1):
             try:
-                res = self.api.download_image(image_url, output_path)
-                if res and not res in ["TIMOUT_DECORATOR_TIMEOUT_SIGNAL", "URLLIB_PROTOCOL_ERROR_SIGNAL"]:
+                if self.api.download_image(image_url, output_path):
                     return True
-                else:
-                    counter += 1
+            except internet_utility.TimeoutException as ex:
+                self._logger.warn(f"Downloading '{image_url}' timed out ({counter} tries): '{ex}'.")
             except Exception as ex:
-                counter += 1
                 self._logger.warn(f"'{ex}' occured while downloading '{image_url}' ({counter} tries).\n\n{traceback.format_exc()}")
-        if counter == 4 and os.path.exists(output_path):
+        if os.path.exists(output_path):
             os.remove(output_path)
-        if try_different_resolutions:
-            for resolution_width in self.standard_img_widths:
-                if self.download_image(self._image_url_for_width(image_url, resolution_width), output_path, tries):
-                    return True
         return False
 
+    def plan_image_url(self, image_url: str) -> Optional[str]:
+        """
+        Method for determining the best available resolution of an image before downloading it.
+        Candidate widths are the requested width followed by the standard widths. They are probed with single byte
+        requests, widths which are known to be served by the image host are probed first and widths which the host 
+        never served are skipped. The results are cached per host in the 'image_resolution_support' cache entry.
+        If the preferred candidate is already known to be served, it is used without probing.
+        :param image_url: Image URL.
+        :return: Image URL of the best available resolution or None, if no resolution is available.
+        """
+        host = urlparse(image_url).hostname or ""
+        with self._resolution_support_lock:
+            support = self.cache.setdefault("image_resolution_support", {}).setdefault(host, {})
+        requested_width = next((part.split("=", 1)[1] for part in image_url.split("/") if part.startswith("width=")), None)
+        if requested_width is None:
+            return image_url if self.api.probe_url(image_url) else None
+
+        candidates = []
+        for width in [requested_width] + [str(width) for width in self.standard_img_widths]:
+            statistics = support.get(width, {"served": 0, "failed": 0})
+            if width not in candidates and (statistics["served"] > 0 or statistics["failed"] < 3):
+                candidates.append(width)
+        candidates.sort(key=lambda width: (width != requested_width, support.get(width, {}).get("served", 0) == 0))
+        if candidates and support.get(candidates[0], {}).get("served", 0) > 0:
+            self.metrics.increment("image_resolution_probes_skipped")
+            return self._image_url_for_width(image_url, candidates[0])
+
+        failed = []
+        for width in candidates:
+            candidate_url = self._image_url_for_width(image_url, width)
+            self.metrics.increment("image_resolution_probes")
+            if self.api.probe_url(candidate_url):
+                with self._resolution_support_lock:
+                    for failed_width in failed:
+                        support.setdefault(failed_width, {"served": 0, "failed": 0})["failed"] += 1
+                    support.setdefault(width, {"served": 0, "failed": 0})["served"] += 1
+                return candidate_url
+            failed.append(width)
+        self._logger.warn(f"No resolution of '{image_url}' is available.")
+        return None
+
     def _image_url_for_width(self, image_url: dict, width: int) -> str:
         """
         Function for getting image URL for specific width.
@@ -261,14 +1083,15 @@ class CivitaiHandler(AbstractHandler):
         score = None
         full_image_count = 0
         full_nsfw_count = 0
-        for model_version in model["metadata"]["modelVersions"]:
-            full_image_count += len(model_version["images"])
-            full_nsfw_count += len([img for img in model_version["images"] if img["nsfw"]])
-            if any(model["file"] == file for file in model_version["files"]):
-                image_count = len(model_version["images"])
-                nsfw_count = len([img for img in model_version["images"] if img["nsfw"]])
+        for model_version in model["model_metadata"].get("modelVersions", []):
+            images = model_version.get("images", [])
+            nsfw_count = len([img for img in images if img.get("nsfw") not in [None, False, "None"]])
+            full_image_count += len(images)
+            full_nsfw_count += nsfw_count
+            if images and any(model["file"] == file["name"] for file in model_version.get("files", [])):
+                image_count = len(images)
                 score = numpy.round(numpy.true_divide(nsfw_count, image_count), decimals=2)
-        if score is None:
+        if score is None and full_image_count:
             self._logger.warn(f"Could not calculate version specific score for '{model['file']}',\ncalculating score over all versions...")
             score = numpy.round(numpy.true_divide(full_nsfw_count, full_image_count), decimals=2)
         self._logger.info(f"Calculated {score} for '{model['file']}'.")
@@ -282,7 +1105,7 @@ class CivitaiHandler(AbstractHandler):
         """
         result = None
         self._logger.info(f"Calculating main tag for '{model['file']}'...")
-        if model["metadata"]["type"].lower() in ["checkpoint", "vae"]:
+        if model["model_metadata"].get("type", "").lower() in ["checkpoint", "vae"]:
             current_reference = cfg.DICTS.CIVITAI_TAGS_A
         else:
             current_reference = cfg.DICTS.CIVITAI_TAGS_B
@@ -314,7 +1137,9 @@ class CivitaiHandler(AbstractHandler):
         :param to_folder: Target folder for model file.
         """ 
         target_path = os.path.join(to_folder, model_entry["file"])
+        identity = hashing_utility.get_file_identity(model_entry["path"])
         shutil.move(model_entry["path"], target_path)
+        self.relocate_indexed_hash(identity, target_path)
         self.cache["tracked"][self.cache["tracked"].index(model_entry["path"])] = target_path
         model_entry["path"] = target_path
         model_entry["status"] = "sorted"
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                      utility                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from logging import Logger
+from typing import Optional
+
+
+LINK_MODES = ["hardlink", "symlink"]
+
+
+class AssetStore(object):
+    """
+    Class, representing a content-addressed store for assets.
+    Each asset is stored once under its key and linked to all paths, where it is needed.
+    Links are tracked as references, assets without references are removed on cleanup.
+    """
+    def __init__(self, folder: str, link_mode: str = "hardlink") -> None:
+        """
+        Initiation method.
+        :param folder: Store folder.
+        :param link_mode: Link mode, see LINK_MODES. Defaults to 'hardlink'.
+            Hardlinks fall back to symlinks, if the link path is located on a different device.
+        """
+        self._logger = Logger("[AssetStore]")
+        self.folder = folder
+        self.link_mode = link_mode
+        self.index_path = os.path.join(folder, "index.json")
+        self._lock = threading.RLock()
+        if not os.path.exists(os.path.join(folder, "blobs")):
+            os.makedirs(os.path.join(folder, "blobs"))
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as in_file:
+                self.index = json.load(in_file)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def _save_index(self) -> None:
+        """
+        Internal method for atomically saving the store index.
+        """
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as out_file:
+            json.dump(self.index, out_file, ensure_ascii=False)
+        os.replace(temporary_path, self.index_path)
+
+    def get_blob_path(self, key: str, extension: str = "") -> str:
+        """
+        Method for getting the storage path of an asset.
+        :param key: Asset key.
+        :param extension: File extension. Defaults to an empty string.
+        :return: Storage path.
+        """
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, "blobs", digest[:2], f"{digest}{extension}")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Method for getting the storage path of a stored asset.
+        :param key: Asset key.
+        :return: Storage path or None, if asset is not stored.
+        """
+        with self._lock:
+            entry = self.index.get(key)
+            return entry["path"] if entry is not None and os.path.exists(entry["path"]) else None
+
+    def add(self, key: str, file_path: str) -> str:
+        """
+        Method for adding an asset by moving a file into the store.
+        :param key: Asset key.
+        :param file_path: File path, the file is moved.
+        :return: Storage path.
+        """
+        blob_path = self.get_blob_path(key, os.path.splitext(file_path)[1])
+        with self._lock:
+            if not os.path.exists(os.path.dirname(blob_path)):
+                os.makedirs(os.path.dirname(blob_path))
+            os.replace(file_path, blob_path)
+            references = self.index.get(key, {}).get("references", [])
+            self.index[key] = {"path": blob_path, "references": references}
+            self._save_index()
+        return blob_path
+
+    def remove(self, key: str) -> bool:
+        """
+        Method for evicting an asset from the store, e.g. if it is corrupt.
+        Hardlinked references keep their content, symlinked references break until they are linked again.
+        :param key: Asset key.
+        :return: True, if an asset was evicted, else False.
+        """
+        with self._lock:
+            entry = self.index.pop(key, None)
+            if entry is None:
+                return False
+            if os.path.exists(entry["path"]):
+                os.remove(entry["path"])
+            self._save_index()
+        return True
+
+    def link(self, key: str, link_path: str) -> bool:
+        """
+        Method for linking a stored asset to a path. Existing files at the link path are replaced.
+        :param key: Asset key.
+        :param link_path: Link path.
+        :return: True, if process was successful, else False.
+        """
+        with self._lock:
+            blob_path = self.get(key)
+            if blob_path is None:
+                return False
+            temporary_path = f"{link_path}.link"
+            if os.path.lexists(temporary_path):
+                os.remove(temporary_path)
+            try:
+                if self.link_mode == "hardlink":
+                    try:
+                        os.link(blob_path, temporary_path)
+                    except OSError:
+                        os.symlink(os.path.abspath(blob_path), temporary_path)
+                else:
+                    os.symlink(os.path.abspath(blob_path), temporary_path)
+                os.replace(temporary_path, link_path)
+            except OSError as ex:
+                self._logger.warn(f"Could not link '{link_path}' to '{blob_path}': '{ex}'.")
+                return False
+            if link_path not in self.index[key]["references"]:
+                self.index[key]["references"].append(link_path)
+                self._save_index()
+            return True
+
+    def _is_linked(self, blob_path: str, link_path: str) -> bool:
+        """
+        Internal method for checking, whether a path still links to a stored asset.
+        :param blob_path: Storage path.
+        :param link_path: Link path.
+        :return: True, if link path links to the storage path, else False.
+        """
+        try:
+            return os.path.samefile(blob_path, link_path)
+        except OSError:
+            return False
+
+    def cleanup(self) -> dict:
+        """
+        Method for cleaning up the store.
+        References, which no longer link to their asset, are dropped and assets without references are removed.
+        :return: Cleanup report with numbers of 'dropped_references', 'removed_assets' and 'freed_bytes'.
+        """
+        report = {"dropped_references": 0, "removed_assets": 0, "freed_bytes": 0}
+        with self._lock:
+            for key in list(self.index):
+                entry = self.index[key]
+                references = [link_path for link_path in entry["references"] if self._is_linked(entry["path"], link_path)]
+                report["dropped_references"] += len(entry["references"]) - len(references)
+                entry["references"] = references
+                if not references:
+                    if os.path.exists(entry["path"]):
+                        report["freed_bytes"] += os.path.getsize(entry["path"])
+                        os.remove(entry["path"])
+                    report["removed_assets"] += 1
+                    self.index.pop(key)
+            self._save_index()
+        self._logger.info(f"Removed {report['removed_assets']} assets, freeing {report['freed_bytes']} bytes.")
+        return report
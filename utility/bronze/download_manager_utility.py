@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                      utility                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import heapq
+import random
+import itertools
+from time import sleep, perf_counter
+from logging import Logger
+from collections import deque
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class DownloadManager(object):
+    """
+    Class, representing a manager for running batches of download jobs over a bounded worker pool.
+    Concurrent jobs per host are limited, failed jobs are retried with exponential backoff.
+    Jobs are only handed to a worker, once their host has a free slot, so that workers never wait for busy hosts.
+    """
+    def __init__(self, workers: int = 8, per_host_limit: int = 4, retries: int = 3,
+                 backoff_factor: float = 1.0, max_backoff: float = 30.0) -> None:
+        """
+        Initiation method.
+        :param workers: Number of worker threads. Defaults to 8.
+        :param per_host_limit: Maximum number of concurrent jobs per host. Defaults to 4.
+        :param retries: Number of tries per job. Defaults to 3.
+        :param backoff_factor: Backoff factor in seconds, the n-th retry waits backoff_factor * 2^(n-1) seconds.
+            Defaults to 1.0.
+        :param max_backoff: Maximum backoff in seconds. Defaults to 30.0.
+        """
+        self._logger = Logger("[DownloadManager]")
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+    def _get_backoff(self, attempt: int) -> float:
+        """
+        Internal method for getting the jittered backoff after a failed try.
+        :param attempt: Number of the failed try.
+        :return: Backoff in seconds.
+        """
+        backoff = min(self.backoff_factor * 2 ** (attempt - 1), self.max_backoff)
+        return backoff * random.uniform(0.5, 1.0)
+
+    def _run_attempt(self, function: Callable[[], bool]) -> Tuple[bool, Optional[str]]:
+        """
+        Internal method for running a single try of a job.
+        :param function: Job function, taking no arguments and returning True on success.
+        :return: Tuple of success flag and error.
+        """
+        try:
+            if function():
+                return True, None
+            return False, "Job was unsuccessful."
+        except Exception as ex:
+            return False, str(ex)
+
+    def run(self, jobs: List[Tuple[Any, str, Callable[[], bool]]],
+            progress_callback: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Method for running a batch of jobs.
+        Jobs are queued per host and dispatched, while their host is below the per host limit. 
+        Retries wait for their backoff outside of the worker pool.
+        :param jobs: Jobs as tuples of job ID, URL and job function, taking no arguments and returning True on success.
+        :param progress_callback: Callback, taking the current report after each finished job. Defaults to None.
+        :return: Report with 'total', 'finished', 'succeeded' and 'retried' job counts, 'failed' jobs,
+            mapped to their last error, and 'seconds'.
+        """
+        start = perf_counter()
+        report = {"total": len(jobs), "finished": 0, "succeeded": 0, "retried": 0, "failed": {}, "seconds": 0.0}
+        queued = {}
+        for job_id, url, function in jobs:
+            queued.setdefault(urlparse(url).hostname or "", deque()).append((job_id, function, 1))
+        delayed = []
+        sequence = itertools.count()
+        active = {host: 0 for host in queued}
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while queued or delayed or futures:
+                while delayed and delayed[0][0] <= perf_counter():
+                    _, _, host, job = heapq.heappop(delayed)
+                    queued.setdefault(host, deque()).appendleft(job)
+                for host in list(queued):
+                    while queued[host] and len(futures) < self.workers and active[host] < self.per_host_limit:
+                        job = queued[host].popleft()
+                        active[host] += 1
+                        futures[executor.submit(self._run_attempt, job[1])] = (host, job)
+                    if not queued[host]:
+                        queued.pop(host)
+                timeout = max(delayed[0][0] - perf_counter(), 0.0) if delayed else None
+                if not futures:
+                    sleep(timeout)
+                    continue
+                done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, (job_id, function, attempt) = futures.pop(future)
+                    active[host] -= 1
+                    success, error = future.result()
+                    if not success and attempt < self.retries:
+                        heapq.heappush(delayed, (perf_counter() + self._get_backoff(attempt), next(sequence), 
+                                                 host, (job_id, function, attempt + 1)))
+                        continue
+                    report["finished"] += 1
+                    report["retried"] += int(attempt > 1)
+                    if success:
+                        report["succeeded"] += 1
+                    else:
+                        report["failed"][job_id] = error
+                    report["seconds"] = perf_counter() - start
+                    if progress_callback is not None:
+                        progress_callback(report)
+        self._logger.info(f"Finished {report['total']} jobs in {round(report['seconds'], 2)} seconds, {len(report['failed'])} failed.")
+        return report
@@ -5,19 +5,260 @@
 *            (c) 2023 Alexander Hering             *
 ****************************************************
 """
+import os
+import mmap
 import hashlib
+import struct
+import zlib
+import functools
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Generator, List, Optional, Tuple
 
 
-def hash_with_sha256(file_path: str) -> str:
+AUTOV1_OFFSET = 0x100000
+AUTOV1_LENGTH = 0x10000
+DEFAULT_BUFFER_SIZE = 128*1024
+DROP_CACHE_INTERVAL = 64*1024*1024
+IO_MODES = ["readinto", "mmap", "fadvise"]
+
+
+def iterate_file_chunks(file_path: str, buffer_size: int = DEFAULT_BUFFER_SIZE, io_mode: str = "readinto") -> Generator[memoryview, None, None]:
+    """
+    Function for iterating over the content of a file in chunks.
+    Note, that chunks are only valid until the next chunk is requested.
+    :param file_path: File path.
+    :param buffer_size: Buffer size in bytes. Defaults to 128 KiB.
+    :param io_mode: I/O mode. Defaults to 'readinto'.
+        'readinto': Unbuffered reads into a reused buffer.
+        'mmap': Zero-copy reads from a memory-mapped file.
+        'fadvise': Unbuffered reads into a reused buffer, advising the kernel to read ahead sequentially
+            and to drop already read pages from the page cache.
+        Modes that are not supported by the platform fall back to 'readinto'.
+    :return: Generator, yielding memoryviews on the chunks.
+    """
+    with open(file_path, 'rb', buffering=0) as f:
+        if io_mode == "mmap" and os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mm) as mv:
+                    for offset in range(0, len(mm), buffer_size):
+                        chunk = mv[offset:offset + buffer_size]
+                        try:
+                            yield chunk
+                        finally:
+                            chunk.release()
+            _drop_cached_pages(f.fileno(), 0, 0)
+        else:
+            fadvise = io_mode == "fadvise" and hasattr(os, "posix_fadvise")
+            if fadvise:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            b  = bytearray(buffer_size)
+            mv = memoryview(b)
+            offset = 0
+            dropped = 0
+            for n in iter(lambda : f.readinto(mv), 0):
+                yield mv[:n]
+                offset += n
+                if fadvise and offset - dropped >= DROP_CACHE_INTERVAL:
+                    _drop_cached_pages(f.fileno(), dropped, offset - dropped)
+                    dropped = offset
+            if fadvise:
+                _drop_cached_pages(f.fileno(), 0, 0)
+
+
+def _drop_cached_pages(file_descriptor: int, offset: int, length: int) -> None:
+    """
+    Internal function for advising the kernel to drop cached pages of a file.
+    :param file_descriptor: File descriptor.
+    :param offset: Offset of the page range.
+    :param length: Length of the page range. A length of 0 stands for the rest of the file.
+    """
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(file_descriptor, offset, length, os.POSIX_FADV_DONTNEED)
+
+
+def hash_with_sha256(file_path: str, buffer_size: int = DEFAULT_BUFFER_SIZE, io_mode: str = "readinto") -> str:
     """
     Function for hashing file with SHA256.
     :param file_path: File path.
+    :param buffer_size: Buffer size in bytes. Defaults to 128 KiB.
+    :param io_mode: I/O mode, see iterate_file_chunks. Defaults to 'readinto'.
     :return: Hash.
     """
     h  = hashlib.sha256()
-    b  = bytearray(128*1024)
-    mv = memoryview(b)
+    for chunk in iterate_file_chunks(file_path, buffer_size, io_mode):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+class MultiHasher(object):
+    """
+    Class, representing a hasher, which calculates all Civitai file hashes in a single pass.
+    Calculated hashes:
+        'SHA256': SHA256 over the full file.
+        'AutoV1': First 8 characters of the SHA256 over 64 KiB, starting at 1 MiB offset.
+        'AutoV2': First 10 characters of the full SHA256.
+        'CRC32': CRC32 over the full file.
+        'AutoV3': First 12 characters of the SHA256 over the file without its header (safetensors only).
+    """
+    def __init__(self, safetensors: bool = False) -> None:
+        """
+        Initiation method.
+        :param safetensors: Flag for declaring the input as safetensors data, enabling the header-less hash.
+            Defaults to False.
+        """
+        self.safetensors = safetensors
+        self._sha256 = hashlib.sha256()
+        self._autov1 = hashlib.sha256()
+        self._autov3 = hashlib.sha256() if safetensors else None
+        self._crc32 = 0
+        self._offset = 0
+        self._prefix = b""
+        self._header_end = None
+
+    def update(self, chunk: Any) -> None:
+        """
+        Method for feeding the next chunk into all hashers.
+        :param chunk: Bytes-like chunk.
+        """
+        chunk_start = self._offset
+        chunk_end = chunk_start + len(chunk)
+        self._sha256.update(chunk)
+        self._crc32 = zlib.crc32(chunk, self._crc32)
+        if chunk_start < AUTOV1_OFFSET + AUTOV1_LENGTH and chunk_end > AUTOV1_OFFSET:
+            self._autov1.update(chunk[max(AUTOV1_OFFSET - chunk_start, 0):AUTOV1_OFFSET + AUTOV1_LENGTH - chunk_start])
+        if self.safetensors:
+            if self._header_end is None and len(self._prefix) < 8:
+                self._prefix += bytes(chunk[:8 - len(self._prefix)])
+                if len(self._prefix) == 8:
+                    self._header_end = 8 + struct.unpack("<Q", self._prefix)[0]
+            if self._header_end is not None and chunk_end > self._header_end:
+                self._autov3.update(chunk[max(self._header_end - chunk_start, 0):])
+        self._offset = chunk_end
+
+    def get_hashed_bytes(self) -> int:
+        """
+        Method for getting the number of hashed bytes.
+        :return: Number of hashed bytes.
+        """
+        return self._offset
+
+    def hexdigests(self) -> dict:
+        """
+        Method for retrieving the calculated hashes.
+        :return: Dictionary, mapping Civitai hash types to upper case hex digests.
+        """
+        sha256 = self._sha256.hexdigest().upper()
+        hashes = {
+            "SHA256": sha256,
+            "AutoV1": self._autov1.hexdigest()[:8].upper(),
+            "AutoV2": sha256[:10],
+            "CRC32": f"{self._crc32:08X}"
+        }
+        if self.safetensors and self._header_end is not None:
+            hashes["AutoV3"] = self._autov3.hexdigest()[:12].upper()
+        return hashes
+
+
+def hash_with_multiple_digests(file_path: str, buffer_size: int = DEFAULT_BUFFER_SIZE, io_mode: str = "readinto") -> dict:
+    """
+    Function for calculating all Civitai file hashes with a single read of the file.
+    :param file_path: File path.
+    :param buffer_size: Buffer size in bytes. Defaults to 128 KiB.
+    :param io_mode: I/O mode, see iterate_file_chunks. Defaults to 'readinto'.
+    :return: Dictionary, mapping Civitai hash types to hashes.
+    """
+    h  = MultiHasher(safetensors=file_path.endswith(".safetensors"))
+    for chunk in iterate_file_chunks(file_path, buffer_size, io_mode):
+        h.update(chunk)
+    return h.hexdigests()
+
+
+def hash_samples(file_path: str, sample_size: int = 64*1024) -> str:
+    """
+    Function for hashing samples from the head, middle and tail of a file together with its size.
+    Equal sample hashes do not prove equal content but files with different sample hashes are guaranteed to differ.
+    :param file_path: File path.
+    :param sample_size: Size of each sample in bytes. Defaults to 64 KiB.
+    :return: Hash.
+    """
+    h = hashlib.sha256()
     with open(file_path, 'rb', buffering=0) as f:
-        for n in iter(lambda : f.readinto(mv), 0):
-            h.update(mv[:n])
-    return h.hexdigest()
\ No newline at end of file
+        size = os.fstat(f.fileno()).st_size
+        h.update(str(size).encode("utf-8"))
+        for offset in sorted({0, max((size - sample_size) // 2, 0), max(size - sample_size, 0)}):
+            f.seek(offset)
+            h.update(f.read(sample_size))
+    return h.hexdigest()
+
+
+def _hash_with_statistics(hash_function: Callable[[str], Any], file_path: str) -> Tuple[Any, dict]:
+    """
+    Internal function for hashing a file and measuring the hashing process.
+    :param hash_function: Hashing function, taking the file path.
+    :param file_path: File path.
+    :return: Tuple of hash and statistics with hashed 'bytes', 'seconds' and 'worker' process ID.
+    """
+    start = perf_counter()
+    file_hash = hash_function(file_path)
+    return file_hash, {"bytes": os.path.getsize(file_path), "seconds": perf_counter() - start, "worker": os.getpid()}
+
+
+def hash_files_in_parallel(file_paths: List[str], workers: Optional[int] = None,
+                           hash_function: Callable[[str], Any] = hash_with_sha256,
+                           statistics_callback: Optional[Callable[[str, dict], None]] = None,
+                           error_callback: Optional[Callable[[str, Exception], None]] = None) -> Generator[Tuple[str, Any], None, None]:
+    """
+    Function for hashing multiple files over a process pool.
+    Results are yielded as soon as they are finished, so the order may differ from the input order.
+    The number of pending files is bounded by the worker count, files are only submitted as results are consumed.
+    :param file_paths: File paths.
+    :param workers: Number of worker processes. Defaults to None in which case the CPU count is used.
+    :param hash_function: Module level hashing function, taking the file path. Defaults to hash_with_sha256.
+        Further arguments can be bound with functools.partial.
+    :param statistics_callback: Callback, taking the file path and the statistics of its hashing process 
+        (hashed 'bytes', 'seconds' and 'worker' process ID). Defaults to None.
+    :param error_callback: Callback, taking the file path and the exception, if a file could not be read. 
+        Defaults to None.
+    :return: Generator, yielding tuples of file path and hash. The hash is None, if the file could not be read.
+    """
+    workers = workers or os.cpu_count() or 1
+    remaining = iter(file_paths)
+    task = functools.partial(_hash_with_statistics, hash_function)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for file_path in remaining:
+            pending[executor.submit(task, file_path)] = file_path
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    pending[executor.submit(task, next_path)] = next_path
+                try:
+                    file_hash, statistics = future.result()
+                except OSError as ex:
+                    if error_callback is not None:
+                        error_callback(file_path, ex)
+                    yield file_path, None
+                    continue
+                if statistics_callback is not None:
+                    statistics_callback(file_path, statistics)
+                yield file_path, file_hash
+
+
+def get_file_identity(file_path: str, stat_result: Optional[os.stat_result] = None) -> str:
+    """
+    Function for getting the identity of a file in the form '<device>:<inode>:<size>:<mtime_ns>'.
+    The identity changes as soon as the file is replaced or its content is modified.
+    :param file_path: File path.
+    :param stat_result: Stat result of the file. Defaults to None in which case the file is stat'ed.
+    :return: File identity.
+    """
+    stat_result = stat_result or os.stat(file_path)
+    return f"{stat_result.st_dev}:{stat_result.st_ino}:{stat_result.st_size}:{stat_result.st_mtime_ns}"
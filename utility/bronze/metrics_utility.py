@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                      utility                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Generator, List
+
+
+def calculate_percentile(values: List[float], percentile: float) -> float:
+    """
+    Function for calculating a percentile with linear interpolation.
+    :param values: Values.
+    :param percentile: Percentile between 0 and 100.
+    :return: Percentile value.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * percentile / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class MetricsCollector(object):
+    """
+    Class, representing a thread-safe collector for counters, timings and throughputs.
+    """
+    def __init__(self) -> None:
+        """
+        Initiation method.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Method for resetting all collected metrics.
+        """
+        with self._lock:
+            self.counters = {}
+            self.timings = {}
+            self.throughputs = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """
+        Method for incrementing a counter.
+        :param name: Counter name.
+        :param value: Increment. Defaults to 1.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_timing(self, name: str, seconds: float) -> None:
+        """
+        Method for recording a timing.
+        :param name: Timing name.
+        :param seconds: Duration in seconds.
+        """
+        with self._lock:
+            self.timings.setdefault(name, []).append(seconds)
+
+    def record_throughput(self, name: str, amount: float, seconds: float) -> None:
+        """
+        Method for recording a processed amount and the time, it took.
+        :param name: Throughput name.
+        :param amount: Processed amount, e.g. bytes.
+        :param seconds: Duration in seconds.
+        """
+        with self._lock:
+            throughput = self.throughputs.setdefault(name, [0, 0.0])
+            throughput[0] += amount
+            throughput[1] += seconds
+
+    @contextmanager
+    def measure(self, name: str) -> Generator[None, None, None]:
+        """
+        Context manager for measuring the duration of a code block as timing.
+        :param name: Timing name.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record_timing(name, perf_counter() - start)
+
+    def summary(self) -> dict:
+        """
+        Method for summarizing the collected metrics.
+        :return: Summary with counters, timing statistics (count, total, mean, percentiles, max) 
+            and throughputs (amount, seconds, rate per second).
+        """
+        with self._lock:
+            summary = {"counters": dict(self.counters), "timings": {}, "throughputs": {}}
+            for name, values in self.timings.items():
+                summary["timings"][name] = {
+                    "count": len(values),
+                    "total": sum(values),
+                    "mean": sum(values) / len(values),
+                    "p50": calculate_percentile(values, 50),
+                    "p90": calculate_percentile(values, 90),
+                    "p99": calculate_percentile(values, 99),
+                    "max": max(values)
+                }
+            for name, (amount, seconds) in self.throughputs.items():
+                summary["throughputs"][name] = {
+                    "amount": amount,
+                    "seconds": seconds,
+                    "per_second": amount / seconds if seconds else 0.0
+                }
+        return summary
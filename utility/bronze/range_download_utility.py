@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                      utility                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import os
+import re
+import json
+import tempfile
+import threading
+from typing import Any, List, Optional, Tuple
+
+
+DEFAULT_CHUNK_SIZE = 16*1024*1024
+CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+def get_ranges(size: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Function for splitting a file into byte ranges.
+    :param size: File size in bytes.
+    :param chunk_size: Chunk size in bytes. Defaults to 16 MiB.
+    :return: List of inclusive (start, end) byte ranges.
+    """
+    return [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+
+def parse_content_range(content_range: Optional[str]) -> Optional[Tuple[int, int, Optional[int]]]:
+    """
+    Function for parsing a Content-Range header value.
+    :param content_range: Content-Range header value.
+    :return: Tuple of inclusive start, inclusive end and total size (None, if unknown) or None, if value is invalid.
+    """
+    match = CONTENT_RANGE_PATTERN.match(content_range or "")
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2)), None if match.group(3) == "*" else int(match.group(3))
+
+
+def get_chunk_map_path(output_path: str) -> str:
+    """
+    Function for getting the chunk map path for a download.
+    :param output_path: Output path.
+    :return: Chunk map path.
+    """
+    return f"{output_path}.chunks.json"
+
+
+def load_chunk_map(output_path: str, size: int, chunk_size: int, source: Any = None) -> dict:
+    """
+    Function for loading the chunk map of a download.
+    Chunk maps, which do not match the given size, chunk size or source, are discarded.
+    :param output_path: Output path.
+    :param size: File size in bytes.
+    :param chunk_size: Chunk size in bytes.
+    :param source: Source identification, e.g. an URL or a hash. Defaults to None.
+    :return: Chunk map with 'size', 'chunk_size', 'source' and 'completed' chunk indices.
+    """
+    chunk_map = {"size": size, "chunk_size": chunk_size, "source": source, "completed": []}
+    try:
+        with open(get_chunk_map_path(output_path), "r", encoding="utf-8") as in_file:
+            stored = json.load(in_file)
+        if all(stored.get(key) == chunk_map[key] for key in ["size", "chunk_size", "source"]) and os.path.exists(output_path):
+            chunk_map["completed"] = sorted(set(stored.get("completed", [])))
+    except (OSError, ValueError):
+        pass
+    return chunk_map
+
+
+def save_chunk_map(output_path: str, chunk_map: dict) -> None:
+    """
+    Function for atomically saving the chunk map of a download.
+    :param output_path: Output path.
+    :param chunk_map: Chunk map.
+    """
+    folder = os.path.dirname(os.path.abspath(output_path))
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w", encoding="utf-8") as out_file:
+        json.dump(chunk_map, out_file)
+    os.replace(temporary_path, get_chunk_map_path(output_path))
+
+
+def remove_chunk_map(output_path: str) -> None:
+    """
+    Function for removing the chunk map of a download.
+    :param output_path: Output path.
+    """
+    if os.path.exists(get_chunk_map_path(output_path)):
+        os.remove(get_chunk_map_path(output_path))
+
+
+def preallocate_file(file_path: str, size: int, keep_content: bool = True) -> None:
+    """
+    Function for preallocating a file. Existing files, which are larger, are truncated to the given size.
+    :param file_path: File path.
+    :param size: File size in bytes.
+    :param keep_content: Flag for keeping existing content. Defaults to True.
+        Should be unset, if the existing content does not belong to the same download, e.g. if its chunk map was discarded.
+    """
+    file_descriptor = os.open(file_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        if not keep_content:
+            os.ftruncate(file_descriptor, 0)
+        elif os.fstat(file_descriptor).st_size > size:
+            os.ftruncate(file_descriptor, size)
+        if size > 0 and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(file_descriptor, 0, size)
+            except OSError:
+                os.ftruncate(file_descriptor, size)
+        else:
+            os.ftruncate(file_descriptor, size)
+    finally:
+        os.close(file_descriptor)
+
+
+class PositionalWriter(object):
+    """
+    Class, representing a writer for concurrently writing data at file offsets.
+    Uses pwrite and pread, where available, and falls back to seeking under a lock.
+    """
+    def __init__(self, file_path: str) -> None:
+        """
+        Initiation method.
+        :param file_path: Path of an existing file.
+        """
+        self.file_descriptor = os.open(file_path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        self._lock = threading.Lock()
+
+    def write(self, offset: int, data: Any) -> None:
+        """
+        Method for writing data at an offset.
+        :param offset: File offset.
+        :param data: Bytes-like data.
+        """
+        with memoryview(data) as view:
+            while len(view):
+                if hasattr(os, "pwrite"):
+                    written = os.pwrite(self.file_descriptor, view, offset)
+                else:
+                    with self._lock:
+                        os.lseek(self.file_descriptor, offset, os.SEEK_SET)
+                        written = os.write(self.file_descriptor, view)
+                view = view[written:]
+                offset += written
+
+    def read(self, offset: int, length: int) -> bytes:
+        """
+        Method for reading back data at an offset.
+        :param offset: File offset.
+        :param length: Maximum number of bytes to read.
+        :return: Read data.
+        """
+        if hasattr(os, "pread"):
+            return os.pread(self.file_descriptor, length, offset)
+        with self._lock:
+            os.lseek(self.file_descriptor, offset, os.SEEK_SET)
+            return os.read(self.file_descriptor, length)
+
+    def close(self) -> None:
+        """
+        Method for closing the writer.
+        """
+        os.close(self.file_descriptor)
+
+    def __enter__(self) -> "PositionalWriter":
+        """
+        Method for entering the writer context.
+        :return: Writer.
+        """
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """
+        Method for exiting the writer context.
+        :param args: Exception information.
+        """
+        self.close()
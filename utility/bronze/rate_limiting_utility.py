@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                      utility                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from time import monotonic, sleep
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+
+THROTTLING_STATUS_CODES = [429, 503]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Function for parsing a Retry-After header value.
+    :param value: Header value, either delay seconds or HTTP date.
+    :return: Delay in seconds or None, if value is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+class TokenBucket(object):
+    """
+    Class, representing a thread-safe token bucket with adaptive rate.
+    Throttling responses halve the rate and block the bucket, successful responses raise the rate again
+    step by step up to the maximum rate (additive increase, multiplicative decrease). Throttling responses, arriving
+    while the bucket is already blocked, only extend the block, so that concurrent requests do not reduce the rate
+    multiple times for the same event.
+    """
+    def __init__(self, rate: float, capacity: float = None, min_rate: float = 0.1, increase_step: float = None) -> None:
+        """
+        Initiation method.
+        :param rate: Maximum rate in tokens per second.
+        :param capacity: Bucket capacity, limiting bursts. Defaults to None in which case the rate is used.
+        :param min_rate: Minimum rate in tokens per second. Defaults to 0.1.
+        :param increase_step: Rate increase per successful response. Defaults to None in which case 5% of the rate is used.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.min_rate = min_rate
+        self.increase_step = increase_step or rate * 0.05
+        self._tokens = self.capacity
+        self._last_refill = monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self) -> float:
+        """
+        Internal method for trying to take a token.
+        :return: 0.0, if a token was taken, else the time in seconds to wait before trying again.
+        """
+        with self._lock:
+            now = monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        """
+        Method for taking a token, blocking until one is available.
+        """
+        wait = self._try_acquire()
+        while wait > 0.0:
+            sleep(wait)
+            wait = self._try_acquire()
+
+    async def acquire_async(self) -> None:
+        """
+        Asynchronous method for taking a token, waiting until one is available.
+        """
+        wait = self._try_acquire()
+        while wait > 0.0:
+            await asyncio.sleep(wait)
+            wait = self._try_acquire()
+
+    def throttle(self, retry_after: Optional[float] = None) -> None:
+        """
+        Method for slowing down after a throttling response.
+        :param retry_after: Delay in seconds, requested by the service. Defaults to None in which case
+            the bucket is blocked for one interval of the reduced rate.
+        """
+        with self._lock:
+            now = monotonic()
+            if now >= self._blocked_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            delay = retry_after if retry_after is not None else 1.0 / self.rate
+            self._blocked_until = max(self._blocked_until, now + delay)
+
+    def reward(self) -> None:
+        """
+        Method for speeding up after a successful response.
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+
+class RateLimiter(object):
+    """
+    Class, representing a rate limiter with separate token buckets for host categories.
+    """
+    def __init__(self, buckets: Dict[str, TokenBucket], category_hosts: Dict[str, List[str]], default_category: str) -> None:
+        """
+        Initiation method.
+        :param buckets: Token buckets by category.
+        :param category_hosts: Hosts by category.
+        :param default_category: Category for hosts, not listed in category_hosts.
+        """
+        self.buckets = buckets
+        self.category_hosts = category_hosts
+        self.default_category = default_category
+
+    def get_bucket(self, url: str) -> TokenBucket:
+        """
+        Method for getting the token bucket for a URL.
+        :param url: URL.
+        :return: Token bucket.
+        """
+        host = urlparse(url).hostname
+        for category in self.category_hosts:
+            if host in self.category_hosts[category]:
+                return self.buckets[category]
+        return self.buckets[self.default_category]
+
+    def acquire(self, url: str) -> None:
+        """
+        Method for waiting until a request to the URL is allowed.
+        :param url: URL.
+        """
+        self.get_bucket(url).acquire()
+
+    async def acquire_async(self, url: str) -> None:
+        """
+        Asynchronous method for waiting until a request to the URL is allowed.
+        :param url: URL.
+        """
+        await self.get_bucket(url).acquire_async()
+
+    def report(self, url: str, status_code: int, retry_after: Optional[str] = None) -> bool:
+        """
+        Method for reporting a response to adapt the rate.
+        :param url: Requested URL.
+        :param status_code: Response status code.
+        :param retry_after: Retry-After header value. Defaults to None.
+        :return: True, if the response was a throttling response, else False.
+        """
+        if status_code in THROTTLING_STATUS_CODES:
+            self.get_bucket(url).throttle(parse_retry_after(retry_after))
+            return True
+        self.get_bucket(url).reward()
+        return False
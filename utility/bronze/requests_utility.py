@@ -9,6 +9,8 @@ from time import sleep
 from typing import Union, List, Any
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from lxml import html
 
 from ..silver import environment_utility, internet_utility
@@ -60,6 +62,31 @@ def get_session(proxy_flag: Union[str, dict] = "none") -> requests.Session:
     return session
 
 
+def get_pooled_session(pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5, 
+                       proxy_flag: Union[str, dict] = "none", respect_retry_after: bool = True) -> requests.Session:
+    """
+    Function for getting requests session with a keep-alive connection pool and transport-level retries.
+    Retries are only issued for idempotent methods (GET, HEAD, OPTIONS) on connection errors and server errors.
+    :param pool_size: Maximum number of kept-alive connections per host. Defaults to 10.
+    :param retries: Maximum number of retries. Defaults to 3.
+    :param backoff_factor: Backoff factor for retries in seconds. Defaults to 0.5.
+    :param proxy_flag: Flag describing session configuration, see get_session. Defaults to 'none'.
+    :param respect_retry_after: Flag for retrying throttled responses (429, 503) with Retry-After header on transport level.
+        Defaults to True. Disable, if throttling is handled by a rate limiter.
+    :return: Session.
+    """
+    session = get_session(proxy_flag)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, 
+                          max_retries=Retry(total=retries, backoff_factor=backoff_factor, 
+                                            status_forcelist=[500, 502, 504],
+                                            allowed_methods=["GET", "HEAD", "OPTIONS"],
+                                            respect_retry_after_header=respect_retry_after,
+                                            raise_on_status=False))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 def safely_get_elements(html_element: html.HtmlElement, xpath: str) -> List[Any]:
     """
     Function for safely searching for elements in a Selenium WebElement.
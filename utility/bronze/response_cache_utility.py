@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                      utility                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import os
+import json
+import hashlib
+import tempfile
+from typing import Optional
+
+
+class ResponseCache(object):
+    """
+    Class, representing an on-disk cache for HTTP responses with validators (ETag, Last-Modified),
+    enabling conditional requests.
+    """
+    def __init__(self, folder: str) -> None:
+        """
+        Initiation method.
+        :param folder: Cache folder.
+        """
+        self.folder = folder
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def _get_path(self, url: str) -> str:
+        """
+        Internal method for getting the cache file path for a URL.
+        :param url: URL.
+        :return: Cache file path.
+        """
+        return os.path.join(self.folder, f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json")
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        Method for getting the cache entry for a URL.
+        :param url: URL.
+        :return: Cache entry with 'url', 'etag', 'last_modified' and 'body' or None, if URL is not cached.
+        """
+        try:
+            with open(self._get_path(url), "r", encoding="utf-8") as in_file:
+                entry = json.load(in_file)
+            return entry if entry.get("url") == url else None
+        except (OSError, ValueError):
+            return None
+
+    def get_conditional_headers(self, url: str) -> dict:
+        """
+        Method for getting the conditional request headers for a URL.
+        :param url: URL.
+        :return: Headers with 'If-None-Match' and/or 'If-Modified-Since', if URL is cached, else empty dictionary.
+        """
+        headers = {}
+        entry = self.get(url)
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, etag: Optional[str], last_modified: Optional[str], body: str) -> bool:
+        """
+        Method for storing a response. Responses without validators are not stored.
+        :param url: URL.
+        :param etag: ETag header value.
+        :param last_modified: Last-Modified header value.
+        :param body: Response body.
+        :return: True, if response was stored, else False.
+        """
+        if not etag and not last_modified:
+            return False
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as out_file:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified, "body": body}, out_file, ensure_ascii=False)
+        os.replace(temporary_path, self._get_path(url))
+        return True
+
+    def remove(self, url: str) -> None:
+        """
+        Method for removing the cache entry for a URL.
+        :param url: URL.
+        """
+        if os.path.exists(self._get_path(url)):
+            os.remove(self._get_path(url))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                      utility                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import json
+import struct
+from typing import Optional
+
+
+MAX_HEADER_SIZE = 100*1024*1024
+
+
+def read_header(file_path: str) -> dict:
+    """
+    Function for reading the JSON header of a safetensors file without reading any tensor data.
+    :param file_path: File path.
+    :return: Header as dictionary.
+    :raises ValueError: If the file does not contain a valid safetensors header.
+    """
+    with open(file_path, "rb") as file:
+        length_bytes = file.read(8)
+        if len(length_bytes) != 8:
+            raise ValueError(f"'{file_path}' is too small to be a safetensors file.")
+        header_size = struct.unpack("<Q", length_bytes)[0]
+        if header_size > MAX_HEADER_SIZE:
+            raise ValueError(f"Header size of '{file_path}' exceeds {MAX_HEADER_SIZE} bytes.")
+        header_bytes = file.read(header_size)
+        if len(header_bytes) != header_size:
+            raise ValueError(f"Header of '{file_path}' is truncated.")
+    header = json.loads(header_bytes)
+    if not isinstance(header, dict):
+        raise ValueError(f"Header of '{file_path}' is not a JSON object.")
+    return header
+
+
+def summarize_header(header: dict, max_metadata_value_length: Optional[int] = 1024) -> dict:
+    """
+    Function for summarizing a safetensors header.
+    :param header: Header as dictionary.
+    :param max_metadata_value_length: Maximum length of embedded metadata values to keep. Longer values are replaced by
+        their length. Defaults to 1024. None keeps all values.
+    :return: Summary with tensor count, dtype counts, parameter count, tensor data size and embedded metadata.
+    """
+    summary = {
+        "tensor_count": 0,
+        "dtypes": {},
+        "parameter_count": 0,
+        "tensor_bytes": 0,
+        "metadata": {}
+    }
+    for key in header:
+        if key == "__metadata__":
+            for metadata_key, value in (header[key] or {}).items():
+                if max_metadata_value_length is None or len(str(value)) <= max_metadata_value_length:
+                    summary["metadata"][metadata_key] = value
+                else:
+                    summary["metadata"][metadata_key] = f"<{len(str(value))} characters>"
+        else:
+            tensor = header[key]
+            parameters = 1
+            for dimension in tensor.get("shape", []):
+                parameters *= dimension
+            summary["tensor_count"] += 1
+            summary["dtypes"][tensor.get("dtype")] = summary["dtypes"].get(tensor.get("dtype"), 0) + 1
+            summary["parameter_count"] += parameters
+            if "data_offsets" in tensor:
+                summary["tensor_bytes"] += tensor["data_offsets"][1] - tensor["data_offsets"][0]
+    return summary
+
+
+def summarize_file(file_path: str, max_metadata_value_length: Optional[int] = 1024) -> dict:
+    """
+    Function for reading and summarizing the header of a safetensors file.
+    :param file_path: File path.
+    :param max_metadata_value_length: Maximum length of embedded metadata values to keep. Defaults to 1024.
+    :return: Header summary.
+    """
+    return summarize_header(read_header(file_path), max_metadata_value_length)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+****************************************************
+*                      utility                 
+*            (c) 2023 Alexander Hering             *
+****************************************************
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight(object):
+    """
+    Class, representing a request coalescer: Concurrent calls for the same key are executed once,
+    all callers wait for and share the result (or the exception) of the call in flight.
+    Results are not cached beyond the lifetime of the call.
+    """
+    def __init__(self) -> None:
+        """
+        Initiation method.
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """
+        Method for executing a function once for all concurrent callers with the same key.
+        :param key: Call key.
+        :param function: Function, taking no arguments.
+        :return: Function result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"event": threading.Event(), "result": None, "exception": None}
+                self._calls[key] = call
+        if leader:
+            try:
+                call["result"] = function()
+            except BaseException as ex:
+                call["exception"] = ex
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call["event"].set()
+        else:
+            call["event"].wait()
+        if call["exception"] is not None:
+            raise call["exception"]
+        return call["result"]
+
+    async def do_async(self, key: Hashable, coroutine_function: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Asynchronous method for awaiting a coroutine once for all concurrent callers with the same key.
+        Calls are coalesced per event loop.
+        :param key: Call key.
+        :param coroutine_function: Coroutine function, taking no arguments.
+        :return: Coroutine result.
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._async_calls.get(loop_key)
+            if task is None:
+                task = asyncio.ensure_future(coroutine_function())
+                self._async_calls[loop_key] = task
+                task.add_done_callback(lambda _: self._forget_async_call(loop_key, task))
+        return await asyncio.shield(task)
+
+    def _forget_async_call(self, loop_key: Hashable, task: asyncio.Future) -> None:
+        """
+        Internal method for forgetting a finished asynchronous call.
+        :param loop_key: Event loop ID and call key.
+        :param task: Finished task.
+        """
+        with self._lock:
+            if self._async_calls.get(loop_key) is task:
+                self._async_calls.pop(loop_key)
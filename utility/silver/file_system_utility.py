@@ -6,7 +6,9 @@
 ****************************************************
 """
 import os
-from typing import List
+import threading
+from time import sleep, time
+from typing import Callable, Dict, List, Optional
 
 
 def create_folder_tree(root: str, structure: list) -> None:
@@ -77,4 +79,170 @@ def get_all_folders(path: str) -> List[str]:
     for root, dirs, files in os.walk(path, topdown=True):
         for folder in dirs:
             folder_list.append(os.path.join(root, folder))
-    return list(set(folder_list))
\ No newline at end of file
+    return list(set(folder_list))
+
+def scan_files_incrementally(root: str, scan_state: dict, file_filter: Optional[Callable[[str], bool]] = None, 
+                             check_files: bool = False) -> Dict[str, List[str]]:
+    """
+    Function for incrementally scanning a folder tree for added, removed and modified files.
+    The scan state maps every known folder to its modification time, its subfolders and its (filtered) files with size and
+    modification time. Folders with an unchanged modification time are not listed again, their files are taken from the
+    scan state. Since changes of nested entries do not affect the modification time of parent folders, known subfolders
+    are still visited, which costs a single stat call per folder.
+    :param root: Root folder.
+    :param scan_state: Scan state of previous runs, updated in place. An empty dictionary leads to a full scan.
+    :param file_filter: Function, taking a file name and returning True, if the file should be tracked.
+        Defaults to None in which case all files are tracked.
+    :param check_files: Flag for stat'ing known files in unchanged folders, detecting in-place modifications. 
+        Defaults to False.
+    :return: Dictionary with lists of 'added', 'removed' and 'modified' file paths.
+    """
+    changes = {"added": [], "removed": [], "modified": []}
+    visited = set()
+    folders = [root]
+    while folders:
+        folder = folders.pop()
+        try:
+            folder_mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            continue
+        visited.add(folder)
+        known_folder = scan_state.get(folder)
+        if known_folder is not None and known_folder["mtime_ns"] == folder_mtime:
+            if check_files:
+                for file_name in known_folder["files"]:
+                    try:
+                        file_stat = os.stat(os.path.join(folder, file_name))
+                    except OSError:
+                        continue
+                    if known_folder["files"][file_name] != [file_stat.st_size, file_stat.st_mtime_ns]:
+                        known_folder["files"][file_name] = [file_stat.st_size, file_stat.st_mtime_ns]
+                        changes["modified"].append(os.path.join(folder, file_name))
+        else:
+            subfolders = []
+            files = {}
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subfolders.append(entry.name)
+                    elif entry.is_file() and (file_filter is None or file_filter(entry.name)):
+                        file_stat = entry.stat()
+                        files[entry.name] = [file_stat.st_size, file_stat.st_mtime_ns]
+            known_files = known_folder["files"] if known_folder is not None else {}
+            for file_name in files:
+                if file_name not in known_files:
+                    changes["added"].append(os.path.join(folder, file_name))
+                elif known_files[file_name] != files[file_name]:
+                    changes["modified"].append(os.path.join(folder, file_name))
+            changes["removed"].extend(os.path.join(folder, file_name) for file_name in known_files if file_name not in files)
+            known_folder = {"mtime_ns": folder_mtime, "subfolders": subfolders, "files": files}
+            scan_state[folder] = known_folder
+        folders.extend(os.path.join(folder, subfolder) for subfolder in known_folder["subfolders"])
+
+    for folder in [folder for folder in scan_state if folder not in visited and (folder == root or folder.startswith(os.path.join(root, "")))]:
+        changes["removed"].extend(os.path.join(folder, file_name) for file_name in scan_state.pop(folder)["files"])
+    return changes
+
+
+
+def watch_folders(folders: List[str], callback: Callable[[List[str], List[str]], None], debounce: float = 5.0, 
+                  file_filter: Optional[Callable[[str], bool]] = None, stop_event: Optional[threading.Event] = None,
+                  poll_interval: float = 1.0) -> None:
+    """
+    Function for watching folder trees for file changes, using inotify on Linux (requires 'watchdog').
+    Changed files are only handed to the callback after they did not receive events for the debounce time and their 
+    size and modification time stayed the same between two checks, so partially written files are not reported.
+    Moved folders are reported as removals of their former file paths and changes of their new file paths.
+    :param folders: Folders to watch recursively.
+    :param callback: Callback, taking the lists of changed and removed file paths.
+    :param debounce: Time in seconds, a file has to be quiet before being reported. Defaults to 5.0 seconds.
+    :param file_filter: Function, taking a file name and returning True, if the file should be watched.
+        Defaults to None in which case all files are watched.
+    :param stop_event: Event for stopping the watch loop. Defaults to None in which case the function runs until interrupted.
+    :param poll_interval: Interval in seconds for checking pending files. Defaults to 1.0 seconds.
+    """
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+
+    lock = threading.Lock()
+    pending = {}
+    removed = set()
+
+    def register_change(path: str) -> None:
+        """Register changed file."""
+        if file_filter is None or file_filter(os.path.basename(path)):
+            with lock:
+                pending[path] = [time(), None]
+                removed.discard(path)
+
+    def register_removal(path: str) -> None:
+        """Register removed file."""
+        if file_filter is None or file_filter(os.path.basename(path)):
+            with lock:
+                pending.pop(path, None)
+                removed.add(path)
+
+    class EventHandler(FileSystemEventHandler):
+        """Class, representing a handler for file system events."""
+        def on_created(self, event) -> None:
+            if not event.is_directory:
+                register_change(event.src_path)
+
+        def on_modified(self, event) -> None:
+            if not event.is_directory:
+                register_change(event.src_path)
+
+        def on_closed(self, event) -> None:
+            if not event.is_directory:
+                register_change(event.src_path)
+
+        def on_deleted(self, event) -> None:
+            if not event.is_directory:
+                register_removal(event.src_path)
+
+        def on_moved(self, event) -> None:
+            if event.is_directory:
+                with lock:
+                    for path in [path for path in pending if path.startswith(os.path.join(event.src_path, ""))]:
+                        pending.pop(path)
+                for path in get_all_files(event.dest_path):
+                    register_removal(os.path.join(event.src_path, os.path.relpath(path, event.dest_path)))
+                    register_change(path)
+            else:
+                register_removal(event.src_path)
+                register_change(event.dest_path)
+
+    stop_event = stop_event or threading.Event()
+    observer = Observer()
+    folders = [folder for folder in folders if os.path.isdir(folder)]
+    for folder in set(folders):
+        if not any(folder != other and folder.startswith(os.path.join(other, "")) for other in folders):
+            observer.schedule(EventHandler(), folder, recursive=True)
+    observer.start()
+    try:
+        while not stop_event.is_set():
+            sleep(poll_interval)
+            ready = []
+            with lock:
+                for path in list(pending):
+                    last_event, last_stat = pending[path]
+                    if time() - last_event < debounce:
+                        continue
+                    try:
+                        file_stat = os.stat(path)
+                    except OSError:
+                        pending.pop(path)
+                        continue
+                    current_stat = (file_stat.st_size, file_stat.st_mtime_ns)
+                    if current_stat == last_stat:
+                        pending.pop(path)
+                        ready.append(path)
+                    else:
+                        pending[path][1] = current_stat
+                removed_paths = list(removed)
+                removed.clear()
+            if ready or removed_paths:
+                callback(ready, removed_paths)
+    finally:
+        observer.stop()
+        observer.join()
@@ -6,10 +6,14 @@
 ****************************************************
 """
 import os
-from PIL import Image
+from PIL import Image, ImageFile
 import logging
-from typing import Any, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Generator, Tuple
 LOGGER = logging.Logger("[ImageUtility]")
+MAX_IMAGE_SIZE = 64*1024*1024
+MAX_IDENTIFICATION_SIZE = 1024*1024
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".webp", ".gif"]
 
 
 def check_image_health(file_path: str) -> bool:
@@ -34,3 +38,79 @@ def check_image_health(file_path: str) -> bool:
     except: 
         LOGGER.warn(f"'{file_path}' is corrupted!")
         return False
+
+
+def check_images_in_parallel(file_paths: List[str], workers: Optional[int] = None, 
+                             chunk_size: int = 64) -> Generator[Tuple[str, bool], None, None]:
+    """
+    Function for checking the health of multiple image files over a process pool.
+    :param file_paths: File paths of image files to check.
+    :param workers: Number of worker processes. Defaults to None in which case the CPU count is used.
+    :param chunk_size: Number of files, which are sent to a worker at once. Defaults to 64.
+    :return: Generator, yielding tuples of file path and health flag in input order.
+    """
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for file_path, healthy in zip(file_paths, executor.map(check_image_health, file_paths, chunksize=chunk_size)):
+            yield file_path, healthy
+
+
+class ImageValidationException(ValueError):
+    """
+    Exception, raised if streamed image data is invalid.
+    """
+    pass
+
+
+class StreamingImageValidator(object):
+    """
+    Class, representing a validator, which checks image data while it streams in.
+    The data is fed into an incremental decoder, so that corrupt data is detected with the first corrupt chunk.
+    """
+    def __init__(self, content_type: Optional[str] = None, content_length: Optional[int] = None, 
+                 max_size: int = MAX_IMAGE_SIZE) -> None:
+        """
+        Initiation method.
+        Raises an ImageValidationException, if the content type or length is invalid.
+        :param content_type: Content type of the image data, if known. Defaults to None.
+        :param content_length: Content length of the image data, if known. Defaults to None.
+        :param max_size: Maximum image data size in bytes. Defaults to 64 MiB.
+        """
+        if content_type is not None and not content_type.lower().startswith("image/"):
+            raise ImageValidationException(f"Content type '{content_type}' is not an image type.")
+        if content_length is not None and content_length > max_size:
+            raise ImageValidationException(f"Content length {content_length} exceeds the maximum size of {max_size} bytes.")
+        self.content_length = content_length
+        self.max_size = max_size
+        self.size = 0
+        self._parser = ImageFile.Parser()
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Method for feeding the next chunk of image data.
+        Raises an ImageValidationException, if the data is invalid or exceeds the maximum size.
+        :param chunk: Image data chunk.
+        """
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise ImageValidationException(f"Image data exceeds the maximum size of {self.max_size} bytes.")
+        try:
+            self._parser.feed(chunk)
+        except Exception as ex:
+            raise ImageValidationException(f"Image data is corrupted: '{ex}'.")
+        if self._parser.image is None and self.size >= MAX_IDENTIFICATION_SIZE:
+            raise ImageValidationException(f"Image format could not be identified within the first {self.size} bytes.")
+
+    def close(self) -> Image.Image:
+        """
+        Method for finishing the validation.
+        Raises an ImageValidationException, if the data is incomplete or invalid.
+        :return: Decoded image.
+        """
+        if self.content_length is not None and self.size != self.content_length:
+            raise ImageValidationException(f"Received {self.size} of {self.content_length} bytes.")
+        try:
+            image = self._parser.close()
+            image.transpose(Image.FLIP_LEFT_RIGHT)
+            return image
+        except Exception as ex:
+            raise ImageValidationException(f"Image data is incomplete or corrupted: '{ex}'.")
@@ -7,10 +7,8 @@
 """
 import os
 import functools
-import functools
-import multiprocessing
-from multiprocessing.pool import ThreadPool
-import urllib3
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import random
 import socket
 import logging
@@ -21,6 +19,10 @@ import requests
 from http_request_randomizer.requests.proxy.requestProxy import RequestProxy
 PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LOGGER = logging.Logger("[InternetUtility]")
+TIMEOUT_EXECUTOR_WORKERS = 32
+TIMEOUT_EXECUTOR = None
+TIMEOUT_EXECUTOR_LOCK = threading.Lock()
+CANCELLATION = threading.local()
 
 
 def check_connection() -> bool:
@@ -49,23 +51,67 @@ def wait_for_connection() -> None:
         sleep(10.0)
 
 
+class TimeoutException(TimeoutError):
+    """
+    Exception, raised if a call exceeds its timeout.
+    """
+    pass
+
+
+def _get_timeout_executor() -> ThreadPoolExecutor:
+    """
+    Internal function for getting the shared timeout executor.
+    :return: Shared, bounded thread pool executor.
+    """
+    global TIMEOUT_EXECUTOR
+    with TIMEOUT_EXECUTOR_LOCK:
+        if TIMEOUT_EXECUTOR is None:
+            TIMEOUT_EXECUTOR = ThreadPoolExecutor(max_workers=TIMEOUT_EXECUTOR_WORKERS, thread_name_prefix="timeout")
+        return TIMEOUT_EXECUTOR
+
+
+def check_cancelled() -> None:
+    """
+    Function for cooperatively cancelling a call, which is running under the timeout decorator.
+    Long running calls should check regularly, e.g. between streamed chunks.
+    Raises a TimeoutException, if the current call timed out.
+    """
+    cancel_event = getattr(CANCELLATION, "event", None)
+    if cancel_event is not None and cancel_event.is_set():
+        raise TimeoutException("Call was cancelled after timing out.")
+
+
 def timeout(max_timeout: float) -> Any:
     """
     Timeout decorator, parameter in seconds.
-    Taken from https://stackoverflow.com/questions/492519/timeout-on-a-function-call.
+    Decorated calls run on a shared, bounded thread pool. Note, that the timeout includes the time, a call waits 
+    for a free worker. On timeout, pending calls are cancelled and running calls are signaled to stop, 
+    which they notice by calling check_cancelled.
+    Calls should additionally use socket level timeouts, so that they do not block workers indefinitely.
+    :return: Wrapped function result. Raises a TimeoutException, if the call timed out.
     """
     def timeout_decorator(item):
         """Wrap the original function."""
         @functools.wraps(item)
         def func_wrapper(*args: Optional[Any], **kwargs: Optional[Any]):
             """Closure for function."""
-            pool = multiprocessing.pool.ThreadPool(processes=1)
-            async_result = pool.apply_async(item, args, kwargs)
-            # raises a TimeoutError if execution exceeds max_timeout
+            cancel_event = threading.Event()
+
+            def run() -> Any:
+                """Run function with cancellation event."""
+                CANCELLATION.event = cancel_event
+                try:
+                    return item(*args, **kwargs)
+                finally:
+                    CANCELLATION.event = None
+
+            future = _get_timeout_executor().submit(run)
             try:
-                return async_result.get(max_timeout)
-            except multiprocessing.context.TimeoutError:
-                return "TIMOUT_DECORATOR_TIMEOUT_SIGNAL"
+                return future.result(max_timeout)
+            except FutureTimeoutError:
+                cancel_event.set()
+                future.cancel()
+                raise TimeoutException(f"'{item.__name__}' timed out after {max_timeout} seconds.")
         return func_wrapper
     return timeout_decorator
 
@@ -110,29 +156,3 @@ def check_port_usable(port: int) -> bool:
         return True
     except OSError:
         return False
-
-
-def timeout(max_timeout: float) -> Any:
-    """
-    Timeout decorator, parameter in seconds.
-    Taken from https://stackoverflow.com/questions/492519/timeout-on-a-function-call.
-    :return: Wrapped function result, if process was successful, else
-        'TIMOUT_DECORATOR_TIMEOUT_SIGNAL': Process timed out
-        'URLLIB_PROTOCOL_ERROR_SIGNAL': Process resulted in urllib error.
-    """
-    def timeout_decorator(item):
-        """Wrap the original function."""
-        @functools.wraps(item)
-        def func_wrapper(*args: Optional[Any], **kwargs: Optional[Any]):
-            """Closure for function."""
-            pool = ThreadPool(processes=1)
-            async_result = pool.apply_async(item, args, kwargs)
-            # raises a TimeoutError if execution exceeds max_timeout
-            try:
-                return async_result.get(max_timeout)
-            except multiprocessing.context.TimeoutError:
-                return "TIMOUT_DECORATOR_TIMEOUT_SIGNAL"
-            except urllib3.exceptions.ProtocolError:
-                return "URLLIB_PROTOCOL_ERROR_SIGNAL"
-        return func_wrapper
-    return timeout_decorator